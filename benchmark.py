@@ -0,0 +1,226 @@
+"""
+Benchmarks the indexer and querier on a synthetic corpus: how long each
+indexing phase takes and how much memory it uses, how long each index file
+takes to read back in, how long a fresh querier takes to answer its first
+query, and the latency percentiles of queries with and without PageRank.
+Results are written as JSON so that runs can be compared.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import file_io
+import synthetic_corpus
+from index import Index
+from query import QueryEngine
+from normalize import stem_stop
+
+
+def percentiles(latencies: list):
+    """
+    :param latencies: a list of latencies in seconds
+    :return: a dictionary of the mean, p50, p90, p99, and max in milliseconds
+    """
+    ordered = sorted(latencies)
+    if len(ordered) == 0:
+        return {}
+
+    def rank(fraction):
+        # nearest-rank percentile
+        return ordered[min(len(ordered) - 1,
+                           max(0, int(round(fraction * len(ordered))) - 1))]
+
+    return {"mean_ms": 1000 * sum(ordered) / len(ordered),
+            "p50_ms": 1000 * rank(0.50),
+            "p90_ms": 1000 * rank(0.90),
+            "p99_ms": 1000 * rank(0.99),
+            "max_ms": 1000 * ordered[-1]}
+
+
+def make_queries(vocabulary: list, num_queries: int, max_terms: int,
+                 skew: float, seed: int):
+    """
+    makes queries of 1 to max_terms words, drawn from the vocabulary with the
+    same Zipf skew as the corpus so that common words show up in queries too
+    :param vocabulary: the corpus words, from most to least frequent
+    :param num_queries: the number of queries to make
+    :param max_terms: the most words in a query
+    :param skew: the Zipf exponent to draw words with
+    :param seed: the seed of the random number generator
+    :return: a list of query strings
+    """
+    rng = random.Random(seed)
+    weights = synthetic_corpus.zipf_weights(len(vocabulary), skew)
+    return [" ".join(rng.choices(vocabulary, cum_weights=weights,
+                                 k=rng.randint(1, max_terms)))
+            for _ in range(num_queries)]
+
+
+def time_queries(engine: QueryEngine, queries: list, use_pagerank: bool):
+    """
+    runs every query once and times each of them
+    :param engine: the QueryEngine to run the queries with
+    :param queries: a list of query strings
+    :param use_pagerank: whether to factor PageRank into the scores
+    :return: a dictionary of latency percentiles and queries per second
+    """
+    latencies = []
+    start = time.perf_counter()
+    for query in queries:
+        query_start = time.perf_counter()
+        engine.search(stem_stop(query.lower().split()), use_pagerank)
+        latencies.append(time.perf_counter() - query_start)
+    elapsed = time.perf_counter() - start
+    results = percentiles(latencies)
+    results["queries"] = len(queries)
+    results["queries_per_s"] = len(queries) / elapsed if elapsed > 0 else 0
+    return results
+
+
+def time_reads(titles: str, docs: str, words: str):
+    """
+    times reading each index file back in the way the querier does
+    :param titles: the titles file
+    :param docs: the docs file
+    :param words: the words file
+    :return: a dictionary of the size and read time of each file
+    """
+    files = {}
+    for name, path, read in (
+            ("titles", titles, lambda: file_io.read_title_file(path, {})),
+            ("docs", docs, lambda: file_io.read_docs_file(path, {})),
+            ("words", words, lambda: file_io.open_words_file(path))):
+        start = time.perf_counter()
+        read()
+        files[name] = {"bytes": os.path.getsize(path),
+                       "read_s": time.perf_counter() - start}
+    return files
+
+
+def time_startup(index_args: list, query: str):
+    """
+    times a fresh querier process from starting up to printing the results of
+    its first query, which includes starting Python and importing everything
+    :param index_args: the arguments that tell query.py which index to load
+    :param query: the query to answer
+    :return: the time to first query in seconds
+    """
+    querier = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           "query.py")
+    start = time.perf_counter()
+    subprocess.run([sys.executable, querier] + index_args,
+                   input=query + "\n:quit\n", capture_output=True,
+                   text=True, check=True)
+    return time.perf_counter() - start
+
+
+def trace_index_memory(xml: str, workdir: str, args):
+    """
+    builds the index again with Python allocations traced, to find the peak
+    traced memory of each phase. It is a separate build from the timed one,
+    since tracing slows the build down several times over.
+    :param xml: the corpus
+    :param workdir: the directory to write the traced build's index files to
+    :param args: the command line arguments of the benchmark
+    :return: a dictionary of each phase to its peak traced memory in bytes
+    """
+    index = Index(xml, os.path.join(workdir, "traced_titles.txt"),
+                  os.path.join(workdir, "traced_docs.txt"),
+                  os.path.join(workdir, "traced_words.txt"),
+                  streaming=args.stream, words_format=args.words_format,
+                  workers=args.workers,
+                  profile_filepath=os.path.join(workdir,
+                                                "traced_profile.json"),
+                  trace_memory=True)
+    phases = index.instrumentation.report()["phases"]
+    return {name: phase["peak_traced_bytes"]
+            for name, phase in phases.items()}
+
+
+def main():
+    """
+    reads in the command line arguments, runs the benchmark, and writes the
+    results as JSON
+    :return: n/a
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmarks indexing and querying on a synthetic corpus")
+    parser.add_argument("--pages", type=int, default=2000)
+    parser.add_argument("--vocab", type=int, default=20000)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--links", type=float, default=5.0,
+                        help="average number of links per page")
+    parser.add_argument("--words-per-page", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--queries", type=int, default=500,
+                        help="number of queries to time in each mode")
+    parser.add_argument("--max-query-terms", type=int, default=4)
+    parser.add_argument("--words-format",
+                        choices=["text", "binary", "compressed"],
+                        default="text")
+    parser.add_argument("--stream", action="store_true")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also build the index a second time with Python "
+                        "allocations traced to report the peak traced memory "
+                        "of each phase")
+    parser.add_argument("--workdir", default="benchmark_data",
+                        help="directory for the corpus and index files")
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    xml = os.path.join(args.workdir, "corpus.xml")
+    titles = os.path.join(args.workdir, "titles.txt")
+    docs = os.path.join(args.workdir, "docs.txt")
+    words = os.path.join(args.workdir, "words.txt")
+    snapshot = os.path.join(args.workdir, "snapshot.pkl")
+
+    start = time.perf_counter()
+    vocabulary = synthetic_corpus.write_corpus(
+        xml, args.pages, args.vocab, args.zipf, args.links,
+        words_per_page=args.words_per_page, seed=args.seed)
+    generate_s = time.perf_counter() - start
+
+    # the phases are timed without tracing allocations, so the times are the
+    # same as a plain build's and memory is the peak resident set size
+    start = time.perf_counter()
+    index = Index(xml, titles, docs, words, streaming=args.stream,
+                  words_format=args.words_format, workers=args.workers,
+                  profile_filepath=os.path.join(args.workdir, "profile.json"),
+                  snapshot_filepath=snapshot)
+    index_s = time.perf_counter() - start
+
+    queries = make_queries(vocabulary, args.queries, args.max_query_terms,
+                           args.zipf, args.seed)
+    engine = QueryEngine(titles, docs, words, cache_size=0)
+
+    results = {
+        "config": vars(args),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "corpus": {"pages": args.pages, "bytes": os.path.getsize(xml),
+                   "generate_s": generate_s},
+        "index": dict(index.instrumentation.report(), total_s=index_s),
+        "files": time_reads(titles, docs, words),
+        "time_to_first_query_s": {
+            "files": time_startup([titles, docs, words], queries[0]),
+            "snapshot": time_startup(["--snapshot", snapshot], queries[0])},
+        "queries": {"plain": time_queries(engine, queries, False),
+                    "pagerank": time_queries(engine, queries, True)},
+    }
+    if args.trace_memory:
+        results["index_peak_traced_bytes"] = trace_index_memory(
+            xml, args.workdir, args)
+    with open(args.output, "w") as output_fh:
+        json.dump(results, output_fh, indent=2)
+    print("Wrote benchmark results to " + args.output)
+
+
+if __name__ == "__main__":
+    main()
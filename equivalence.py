@@ -0,0 +1,289 @@
+"""
+Checks that the ways of building and querying the index that are meant to
+give the same results as the plain ones do, on a small synthetic corpus:
+pruned scoring, snapshots, PageRank tiers, and shards against scoring every
+document of an in-memory build, and spilled, parallel, and incremental
+builds, unsharded and sharded, against the index files of an in-memory
+build. It prints a line per
+check and exits with status 1 if any of them failed, so it can be run after
+a change to any of them.
+"""
+
+import argparse
+import math
+import os
+import sys
+import tempfile
+import xml.etree.ElementTree as et
+import benchmark
+import file_io
+import synthetic_corpus
+from index import Index
+from normalize import stem_stop
+from query import QueryEngine, ShardedQueryEngine
+
+# the number of shards the sharded index is split into
+NUM_SHARDS = 3
+
+# the fraction of the pages in the high-authority tier of the tiered index
+HIGH_TIER = 0.1
+
+# how far apart the PageRanks of an incremental update and a full build may
+# be, since the update starts from the old ranks and stops at the threshold
+PAGERANK_TOLERANCE = 1e-3
+
+
+def index_files(workdir: str, name: str):
+    """
+    :param workdir: the directory the index files are in
+    :param name: the name of the build, which the files are named after
+    :return: a tuple of the titles, docs, and words files of the build
+    """
+    return tuple(os.path.join(workdir, "%s_%s.txt" % (name, kind))
+                 for kind in ("titles", "docs", "words"))
+
+
+def same_files(first: tuple, second: tuple):
+    """
+    :param first: a tuple of filepaths
+    :param second: a tuple of filepaths to compare them with, in order
+    :return: whether every pair of files exists and has the same bytes
+    """
+    if not all(map(os.path.exists, first + second)):
+        return False
+    for first_filepath, second_filepath in zip(first, second):
+        with open(first_filepath, "rb") as first_fh, \
+                open(second_filepath, "rb") as second_fh:
+            if first_fh.read() != second_fh.read():
+                return False
+    return True
+
+
+def shard_files(files: tuple):
+    """
+    :param files: a tuple of the titles, docs, and words files of a sharded
+    build
+    :return: a tuple of the titles, docs, and words files of every shard
+    """
+    return tuple(file_io.shard_filepath(filepath, shard)
+                 for shard in range(NUM_SHARDS) for filepath in files)
+
+
+def close_ranks(docs: tuple, expected_docs: tuple):
+    """
+    :param docs: a tuple of docs files
+    :param expected_docs: a tuple of the docs files to compare them with
+    :return: whether the docs files rank the same pages, with PageRanks
+    within PAGERANK_TOLERANCE of the expected ones
+    """
+    if not all(map(os.path.exists, docs + expected_docs)):
+        return False
+    ranks = {}
+    for filepath in docs:
+        file_io.read_docs_file(filepath, ranks)
+    expected_ranks = {}
+    for filepath in expected_docs:
+        file_io.read_docs_file(filepath, expected_ranks)
+    return ranks.keys() == expected_ranks.keys() and math.sqrt(sum(
+        (ranks[id] - expected_ranks[id]) ** 2
+        for id in ranks)) <= PAGERANK_TOLERANCE
+
+
+def rankings(engine, queries: list):
+    """
+    :param engine: the QueryEngine or ShardedQueryEngine to answer with
+    :param queries: a list of lists of query terms
+    :return: a list of the rankings of every query, without and with
+    PageRank
+    """
+    return [engine.search(terms, use_pagerank)
+            for terms in queries for use_pagerank in (False, True)]
+
+
+def split_corpus(xml_filepath: str, workdir: str, seed: int):
+    """
+    splits a corpus into a base corpus and a delta that turns it back into
+    the corpus less some deleted pages: the delta adds the last tenth of the
+    pages, changes the text of some pages back to what it is in the corpus,
+    and deletes a few
+    :param xml_filepath: the corpus
+    :param workdir: the directory to write the corpora to
+    :param seed: picks the pages that are changed and deleted
+    :return: a tuple of the filepaths of the base corpus, the delta, and the
+    corpus the delta should turn the base into
+    """
+    pages = et.parse(xml_filepath).getroot().findall("page")
+    num_base = len(pages) - len(pages) // 10
+    changed = set(range(seed % 7, num_base, 7))
+    deleted = set(range(seed % 11 + 3, num_base, 11)) - changed
+
+    def write(name, page_elements):
+        root = et.Element("xml")
+        root.extend(page_elements)
+        filepath = os.path.join(workdir, name)
+        et.ElementTree(root).write(filepath, encoding="unicode")
+        return filepath
+
+    base = []
+    for number, page in enumerate(pages[:num_base]):
+        if number in changed:
+            page = et.fromstring(et.tostring(page))
+            page.find("text").text = " ".join(
+                reversed((page.find("text").text or "").split()))
+        base.append(page)
+    delta = [pages[number] for number in sorted(changed)]
+    for number in sorted(deleted):
+        page = et.Element("page", deleted="true")
+        et.SubElement(page, "id").text = pages[number].find("id").text
+        delta.append(page)
+    delta.extend(pages[num_base:])
+    final = [page for number, page in enumerate(pages)
+             if number not in deleted]
+    return (write("base.xml", base), write("delta.xml", delta),
+            write("final.xml", final))
+
+
+def check_queries(xml: str, workdir: str, queries: list):
+    """
+    checks that pruned scoring, snapshots, PageRank tiers, and shards give
+    the same rankings as scoring every document of an in-memory build
+    :param xml: the corpus
+    :param workdir: the directory to write the index files to
+    :param queries: a list of lists of query terms
+    :return: a list of (name of check, whether it passed) tuples
+    """
+    checks = []
+    files = index_files(workdir, "plain")
+    Index(xml, *files)
+    engine = QueryEngine(*files, cache_size=0, prune=False)
+    expected = rankings(engine, queries)
+    engine.close()
+
+    for words_format in ("text", "binary"):
+        files = index_files(workdir, words_format)
+        snapshot = os.path.join(workdir, words_format + ".pkl")
+        Index(xml, *files, words_format=words_format,
+              snapshot_filepath=snapshot)
+        engine = QueryEngine(*files, cache_size=0, prune=True)
+        checks.append(("pruned %s words" % words_format,
+                       rankings(engine, queries) == expected))
+        engine.close()
+        engine = QueryEngine(*files, cache_size=0, snapshot=snapshot)
+        checks.append(("snapshot of %s words" % words_format,
+                       rankings(engine, queries) == expected))
+        engine.close()
+
+        files = index_files(workdir, "tiered_" + words_format)
+        Index(xml, *files, words_format=words_format, high_tier=HIGH_TIER)
+        engine = QueryEngine(*files, cache_size=0, tiered=True)
+        checks.append(("tiered %s words" % words_format,
+                       rankings(engine, queries) == expected))
+        engine.close()
+
+    # compressed relevances are rounded, so they are checked against scoring
+    # every document of the same files
+    files = index_files(workdir, "compressed")
+    Index(xml, *files, words_format="compressed")
+    exhaustive = QueryEngine(*files, cache_size=0, prune=False)
+    pruned = QueryEngine(*files, cache_size=0, prune=True)
+    checks.append(("pruned compressed words",
+                   rankings(pruned, queries) == rankings(exhaustive, queries)))
+    exhaustive.close()
+    pruned.close()
+
+    files = index_files(workdir, "sharded")
+    Index(xml, *files, shards=NUM_SHARDS)
+    engine = ShardedQueryEngine(*files, NUM_SHARDS)
+    checks.append(("%d shards" % NUM_SHARDS,
+                   rankings(engine, queries) == expected))
+    engine.close()
+    return checks
+
+
+def check_builds(xml: str, workdir: str, seed: int):
+    """
+    checks that spilled, parallel, and incremental builds, unsharded and
+    sharded, write the same index files as an in-memory build
+    :param xml: the corpus
+    :param workdir: the directory to write the index files to
+    :param seed: picks the pages the incremental update changes and deletes
+    :return: a list of (name of check, whether it passed) tuples
+    """
+    checks = []
+    expected = index_files(workdir, "plain")
+    Index(xml, *expected)
+    for name, options in (
+            ("spilled", {"memory_budget": 1 << 16}),
+            ("streamed and spilled", {"memory_budget": 1 << 16,
+                                      "streaming": True}),
+            ("parallel", {"workers": 2})):
+        files = index_files(workdir, name.replace(" ", "_"))
+        Index(xml, *files, spill_dirpath=workdir, **options)
+        checks.append((name + " build", same_files(files, expected)))
+
+    base, delta, final = split_corpus(xml, workdir, seed)
+    for shards in (1, NUM_SHARDS):
+        name = "incremental" if shards == 1 else "sharded incremental"
+        prefix = name.replace(" ", "_")
+        expected = index_files(workdir, prefix + "_final")
+        Index(final, *expected, shards=shards)
+        files = index_files(workdir, prefix)
+        state = os.path.join(workdir, prefix + "_state.pkl")
+        Index(base, *files, state_filepath=state, shards=shards)
+        Index(delta, *files, state_filepath=state, incremental=True,
+              shards=shards)
+        if shards > 1:
+            files = shard_files(files)
+            expected = shard_files(expected)
+        checks.append((name + " titles and words",
+                       same_files(files[0::3] + files[2::3],
+                                  expected[0::3] + expected[2::3])))
+        # PageRank starts from the old ranks, so it only stops at about the
+        # same ranks as a full build
+        checks.append((name + " PageRank",
+                       close_ranks(files[1::3], expected[1::3])))
+    return checks
+
+
+def main():
+    """
+    reads in the command line arguments, runs the checks, and prints whether
+    each passed
+    :return: n/a
+    """
+    parser = argparse.ArgumentParser(
+        description="Checks that pruning, snapshots, tiers, shards, and "
+        "spilled, parallel, and incremental builds match the plain index")
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--vocab", type=int, default=2000)
+    parser.add_argument("--zipf", type=float, default=1.1)
+    parser.add_argument("--words-per-page", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir",
+                        help="directory for the corpus and index files, a "
+                        "temporary one that is removed afterwards if not "
+                        "given")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_dirpath:
+        workdir = args.workdir or temp_dirpath
+        os.makedirs(workdir, exist_ok=True)
+        xml = os.path.join(workdir, "corpus.xml")
+        vocabulary = synthetic_corpus.write_corpus(
+            xml, args.pages, args.vocab, args.zipf,
+            words_per_page=args.words_per_page, seed=args.seed)
+        queries = [stem_stop(query.lower().split())
+                   for query in benchmark.make_queries(
+                       vocabulary, args.queries, 4, args.zipf, args.seed)]
+        checks = check_queries(xml, workdir, queries) + \
+            check_builds(xml, workdir, args.seed)
+
+    for name, passed in checks:
+        print("%-40s %s" % (name, "ok" if passed else "FAILED"))
+    if not all(passed for _, passed in checks):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,7 +3,138 @@ Provides functionality for reading from/writing to the 3 index files used by
 indexer and querier in search
 """
 
-from pyparsing import Word, WordStart
+import mmap
+import os
+import pickle
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+from contextlib import contextmanager
+import numpy as np
+from postings import Postings, sum_relevances
+
+# binary words file layout (all little-endian):
+# header: magic, version, number of terms
+# compressed files only: number of docs, relevance precision, then an int64
+#   table of the original id of each dense doc number
+# term table: one entry per term in sorted order of
+#   (term offset in term blob, term length, postings offset, postings count,
+#   highest term relevance in the postings)
+# term blob: the utf-8 bytes of every term, in the same order
+# postings, for each term in the same order:
+#   raw files: an int64 array of ids then a float64 array of term relevances
+#   compressed files: a varint of the gap from the previous dense doc number
+#   and a varint of the quantized relevance for each posting, by doc number
+WORDS_MAGIC = b"SEWORDS\0"
+WORDS_RAW = 1
+WORDS_COMPRESSED = 2
+WORDS_HEADER = struct.Struct("<8sII")
+COMPRESSED_HEADER = struct.Struct("<II")
+WORDS_ENTRY = struct.Struct("<QIQId")
+
+# number of decimal places relevances are kept to in compressed words files
+DEFAULT_PRECISION = 6
+
+# version of the query-ready snapshot of all three index files
+SNAPSHOT_VERSION = 1
+
+# binary titles file layout (all little-endian):
+# header: magic, version, number of docs
+# id table: the int64 id of each dense doc number, in increasing order
+# offset table: the uint64 offset of the title of each dense doc number in
+#   the title blob, then the length of the blob
+# title blob: the utf-8 bytes of every title, by dense doc number
+TITLES_MAGIC = b"SETITLE\0"
+TITLES_VERSION = 1
+TITLES_HEADER = struct.Struct("<8sII")
+
+# lexicon file layout (all little-endian):
+# header: magic, version, number of terms, terms per block, number of blocks
+# block table: the uint64 offset in the file of each block
+# blocks of up to LEXICON_BLOCK_SIZE terms in sorted order, front coded: for
+#   each term, a varint of the number of leading bytes it shares with the
+#   term before it in the block (0 for the first term of a block), a varint
+#   of the number of bytes after those, the bytes themselves, a varint of
+#   its document frequency, and a varint of its slot in the words file
+LEXICON_MAGIC = b"SELEXIC\0"
+LEXICON_VERSION = 1
+LEXICON_HEADER = struct.Struct("<8sIIII")
+LEXICON_BLOCK_SIZE = 16
+
+# link graph file layout (all little-endian), the CSR arrays of
+# pagerank.build_csr:
+# header: magic, version, number of docs, number of links
+# id table: the int64 id of each dense doc number, in the order the pages
+#   were ranked in
+# row pointer table: the int64 index in the link table of the first link of
+#   each dense doc number, then the number of links
+# link table: the int32 dense doc numbers each page links to, sorted within
+#   each page
+GRAPH_MAGIC = b"SEGRAPH\0"
+GRAPH_VERSION = 1
+GRAPH_HEADER = struct.Struct("<8sIIQ")
+
+
+def shard_filepath(filepath: str, shard: int):
+    """
+    names the file of one shard of a sharded index after the file of the
+    unsharded index, by putting the shard number before the extension
+    :param filepath: the file name of the unsharded index file, like titles.txt
+    :param shard: the number of the shard, counting from 0
+    :return: the file name of the shard's index file, like titles.0.txt
+    """
+    root, extension = os.path.splitext(filepath)
+    return root + "." + str(shard) + extension
+
+
+def tier_filepath(filepath: str, tier: int):
+    """
+    names the words file of one tier of a tiered index after the words file
+    of the untiered index, by putting the tier before the extension
+    :param filepath: the file name of the untiered words file, like words.txt
+    :param tier: the number of the tier, 0 for the high-authority tier and 1
+    for the tail tier
+    :return: the file name of the tier's words file, like words.tier0.txt
+    """
+    root, extension = os.path.splitext(filepath)
+    return root + ".tier" + str(tier) + extension
+
+
+def tiers_filepath(filepath: str):
+    """
+    names the file of the bounds of a tiered index after the words file of
+    the untiered index
+    :param filepath: the file name of the untiered words file, like words.txt
+    :return: the file name of the tiers file, like words.tiers.txt
+    """
+    root, extension = os.path.splitext(filepath)
+    return root + ".tiers" + extension
+
+
+@contextmanager
+def open_for_replace(filepath: str, mode: str = "w"):
+    """
+    opens a temporary file next to filepath to write in its place, and once
+    it has been written and closed, renames it over filepath. The rename is
+    atomic, so a querier that reloads the index when its files change only
+    ever sees the old file or the whole new one, never a partly written one.
+    If writing fails, the temporary file is removed and filepath is left as
+    it was.
+    :param filepath: the file that will get written to
+    :param mode: "w" to write text or "wb" to write bytes
+    :return: the open temporary file
+    """
+    temp_filepath = "%s.%d.tmp" % (filepath, os.getpid())
+    try:
+        with open(temp_filepath, mode) as temp_fh:
+            yield temp_fh
+        os.replace(temp_filepath, filepath)
+    except BaseException:
+        if os.path.exists(temp_filepath):
+            os.remove(temp_filepath)
+        raise
 
 
 def write_title_file(title: str, dictionary: dict):
@@ -16,11 +147,38 @@ def write_title_file(title: str, dictionary: dict):
     :param dictionary: a hashmap that maps a page's id to its title
     :return: n/a
     """
-    with open(title, "w") as title_fh:
+    with open_for_replace(title, "w") as title_fh:
         for id_num, title in dictionary.items():
             title_fh.write(str(id_num) + "::" + title + "\n")
 
 
+def write_title_binary_file(titles: str, ids_to_titles: dict):
+    """
+    Writes the dictionary of ids to titles in the binary titles format: the
+    ids in increasing order, which numbers the documents densely, and a
+    fixed-width table of where each document's title starts, so a querier can
+    memory-map the file and decode only the titles it shows
+    :param titles: the file that will get written to
+    :param ids_to_titles: a hashmap that maps a page's id to its title
+    :return: n/a
+    """
+    ids = array("q", sorted(int(id_num) for id_num in ids_to_titles))
+    titles_by_id = {int(id_num): title
+                    for id_num, title in ids_to_titles.items()}
+    blob = bytearray()
+    offsets = array("Q")
+    for id_num in ids:
+        offsets.append(len(blob))
+        blob += titles_by_id[id_num].encode("utf-8")
+    offsets.append(len(blob))
+    with open_for_replace(titles, "wb") as titles_fh:
+        titles_fh.write(TITLES_HEADER.pack(TITLES_MAGIC, TITLES_VERSION,
+                                           len(ids)))
+        titles_fh.write(_to_little_endian(ids).tobytes())
+        titles_fh.write(_to_little_endian(offsets).tobytes())
+        titles_fh.write(blob)
+
+
 def write_docs_file(docs: str, ids_to_pageranks: dict):
     """
     Writes the dictionary of ids the value of
@@ -32,11 +190,44 @@ def write_docs_file(docs: str, ids_to_pageranks: dict):
     :param ids_to_pageranks: dictionary of ids --> pageranks
     :return: n/a
     """
-    with open(docs, "w") as docs_fh:
+    with open_for_replace(docs, "w") as docs_fh:
         for id_num, rank in ids_to_pageranks.items():
             docs_fh.write(str(id_num) + " " + str(rank) + "\n")
 
 
+def write_tiers_file(tiers: str, tail_page_rank: float):
+    """
+    Writes what the querier needs to know about the tiers of a tiered index
+    without reading their postings
+    output looks like:
+    tail_page_rank
+    :param tiers: filepath to the tiers file
+    :param tail_page_rank: the highest PageRank of a page in the tail tier
+    :return: n/a
+    """
+    with open_for_replace(tiers, "w") as tiers_fh:
+        tiers_fh.write(str(tail_page_rank) + "\n")
+
+
+def write_graph_file(graph: str, ids, indptr, indices):
+    """
+    Writes a link graph over dense doc numbers in the link graph format, so
+    PageRank can be run again without parsing the XML, and the arrays can be
+    memory-mapped straight back in
+    :param graph: the file that will get written to
+    :param ids: a list of the id of each dense doc number
+    :param indptr: the CSR row pointer numpy array of length n + 1
+    :param indices: the CSR numpy array of link targets
+    :return: n/a
+    """
+    with open_for_replace(graph, "wb") as graph_fh:
+        graph_fh.write(GRAPH_HEADER.pack(GRAPH_MAGIC, GRAPH_VERSION, len(ids),
+                                         len(indices)))
+        graph_fh.write(np.asarray(ids, dtype="<i8").tobytes())
+        graph_fh.write(np.asarray(indptr, dtype="<i8").tobytes())
+        graph_fh.write(np.asarray(indices, dtype="<i4").tobytes())
+
+
 def write_words_file(words: str, words_to_doc_relevance: dict):
     """
     Writes the dictionary of words to ids to number of appearances
@@ -47,14 +238,621 @@ def write_words_file(words: str, words_to_doc_relevance: dict):
     :param words_to_doc_relevance: the dictionary that provides words -> ids -> term relevance
     :return: n/a
     """
-    with open(words, "w") as words_fh:
-        for word, ids_to_relevance in words_to_doc_relevance.items():
+    write_words_stream(words, (
+        (word, ids_to_relevance.keys(), ids_to_relevance.values())
+        for word, ids_to_relevance in words_to_doc_relevance.items()))
+
+
+def write_words_stream(words: str, term_postings):
+    """
+    Writes the postings of one word at a time in the same format as
+    write_words_file, so the whole index never has to be in memory
+    :param words: the file that will get written to
+    :param term_postings: an iterable of (word, ids, term relevances) tuples
+    :return: n/a
+    """
+    with open_for_replace(words, "w") as words_fh:
+        for word, ids, relevances in term_postings:
             words_fh.write(word + " ")
-            for id_num, relevance in ids_to_relevance.items():
+            for id_num, relevance in zip(ids, relevances):
                 words_fh.write(str(id_num) + " " + str(relevance) + " ")
             words_fh.write("\n")
 
 
+def _to_little_endian(values: array):
+    """
+    swaps the bytes of a typed array in place on big-endian machines so the
+    binary index files are always stored little-endian
+    :param values: the typed array to swap
+    :return: the same array
+    """
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def _encode_varint(value: int, out: bytearray):
+    """
+    appends a non-negative int to out using 7 bits per byte, where the high
+    bit of a byte is set if more bytes follow
+    :param value: the int to encode
+    :param out: the bytes to append to
+    :return: n/a
+    """
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _decode_varint(buffer, offset: int):
+    """
+    decodes a varint written by _encode_varint
+    :param buffer: the bytes or mmap to decode from
+    :param offset: where the varint starts
+    :return: a tuple of the int and the offset just past it
+    """
+    value = shift = 0
+    while True:
+        byte = buffer[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _write_words_table(words_fh, terms: list, postings: list, start: int):
+    """
+    writes the term table, term blob, and postings sections of a binary words
+    file
+    :param words_fh: the file being written, positioned at start
+    :param terms: the utf-8 bytes of each term in sorted order
+    :param postings: a (count, highest relevance, encoded bytes) tuple for
+    each term
+    :param start: the offset in the file that the term table begins at
+    :return: n/a
+    """
+    blob_offset = start + WORDS_ENTRY.size * len(terms)
+    offset = blob_offset + sum(len(term) for term in terms)
+    term_offset = 0
+    for term, (count, max_relevance, encoded) in zip(terms, postings):
+        words_fh.write(WORDS_ENTRY.pack(term_offset, len(term), offset, count,
+                                        max_relevance))
+        term_offset += len(term)
+        offset += len(encoded)
+    for term in terms:
+        words_fh.write(term)
+    for _, _, encoded in postings:
+        words_fh.write(encoded)
+
+
+def write_words_binary_file(words: str, words_to_doc_relevance: dict):
+    """
+    Writes the dictionary of words to ids to term relevance in the binary words
+    format: a sorted term table with offsets into packed arrays of ids and
+    relevances, so a querier can look up single terms without parsing the file
+    :param words: the file that will get written to
+    :param words_to_doc_relevance: the dictionary that provides words -> ids -> term relevance
+    :return: n/a
+    """
+    terms = sorted((word.encode("utf-8"), word)
+                   for word in words_to_doc_relevance)
+    postings = []
+    for _, word in terms:
+        ids_to_relevance = words_to_doc_relevance[word]
+        ids = array("q", (int(id_num) for id_num in ids_to_relevance))
+        relevances = array("d", ids_to_relevance.values())
+        postings.append((len(ids), max(relevances, default=0.0),
+                         _to_little_endian(ids).tobytes() +
+                         _to_little_endian(relevances).tobytes()))
+
+    with open_for_replace(words, "wb") as words_fh:
+        words_fh.write(WORDS_HEADER.pack(WORDS_MAGIC, WORDS_RAW, len(terms)))
+        _write_words_table(words_fh, [term for term, _ in terms], postings,
+                           WORDS_HEADER.size)
+
+
+def write_words_compressed_file(words: str, words_to_doc_relevance: dict,
+                                doc_ids: list,
+                                precision: int = DEFAULT_PRECISION):
+    """
+    Writes the dictionary of words to ids to term relevance in the compressed
+    binary words format. Ids are remapped to dense doc numbers, their position
+    in doc_ids, which is stored as the mapping table. Each term's postings are
+    sorted by doc number and stored as varint gaps, with each relevance
+    rounded to precision decimal places and stored as a varint
+    :param words: the file that will get written to
+    :param words_to_doc_relevance: the dictionary that provides words -> ids -> term relevance
+    :param doc_ids: every id in the corpus, in the order to number them
+    :param precision: the number of decimal places to keep of each relevance
+    :return: n/a
+    """
+    doc_numbers = {int(id_num): number
+                   for number, id_num in enumerate(doc_ids)}
+    scale = 10 ** precision
+    terms = sorted((word.encode("utf-8"), word)
+                   for word in words_to_doc_relevance)
+    postings = []
+    for _, word in terms:
+        encoded = bytearray()
+        previous = 0
+        max_quantized = 0
+        for number, relevance in sorted(
+                (doc_numbers[int(id_num)], relevance) for id_num, relevance in
+                words_to_doc_relevance[word].items()):
+            quantized = round(relevance * scale)
+            _encode_varint(number - previous, encoded)
+            _encode_varint(quantized, encoded)
+            previous = number
+            max_quantized = max(max_quantized, quantized)
+        postings.append((len(words_to_doc_relevance[word]),
+                         max_quantized / scale, bytes(encoded)))
+
+    with open_for_replace(words, "wb") as words_fh:
+        words_fh.write(WORDS_HEADER.pack(WORDS_MAGIC, WORDS_COMPRESSED,
+                                         len(terms)))
+        words_fh.write(COMPRESSED_HEADER.pack(len(doc_ids), precision))
+        table = array("q", (int(id_num) for id_num in doc_ids))
+        words_fh.write(_to_little_endian(table).tobytes())
+        _write_words_table(words_fh, [term for term, _ in terms], postings,
+                           WORDS_HEADER.size + COMPRESSED_HEADER.size +
+                           8 * len(doc_ids))
+
+
+class BinaryWordsIndex:
+    """
+    Read-only view of a binary words file, raw or compressed. The file is
+    memory-mapped and the postings of a term are only decoded when that term
+    is looked up, so opening the index takes constant time and only the pages
+    of terms that queries use are brought into memory.
+    """
+
+    def __init__(self, words: str):
+        """
+        opens and memory-maps the binary words file
+        :param words: the file name that the binary words file was written to
+        :return: n/a
+        """
+        self.words = words
+        self.words_fh = open(words, "rb")
+        self.mm = mmap.mmap(self.words_fh.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.num_terms = WORDS_HEADER.unpack_from(
+            self.mm, 0)
+        if magic != WORDS_MAGIC or \
+                self.version not in (WORDS_RAW, WORDS_COMPRESSED):
+            raise IOError("Not a binary words file: " + words)
+        self.table_offset = WORDS_HEADER.size
+        self.doc_ids = None
+        if self.version == WORDS_COMPRESSED:
+            self.num_docs, self.precision = COMPRESSED_HEADER.unpack_from(
+                self.mm, WORDS_HEADER.size)
+            self.scale = 10 ** self.precision
+            start = WORDS_HEADER.size + COMPRESSED_HEADER.size
+            self.table_offset = start + 8 * self.num_docs
+            if sys.byteorder == "little":
+                self.doc_ids = memoryview(self.mm)[
+                    start:self.table_offset].cast("q")
+            else:
+                self.doc_ids = array("q")
+                self.doc_ids.frombytes(self.mm[start:self.table_offset])
+                self.doc_ids.byteswap()
+        self.blob_offset = self.table_offset + \
+            WORDS_ENTRY.size * self.num_terms
+
+    def __len__(self):
+        return self.num_terms
+
+    def __getstate__(self):
+        # the mmap can't be pickled, so other processes open the file again
+        return self.words
+
+    def __setstate__(self, words: str):
+        self.__init__(words)
+
+    def _entry(self, slot: int):
+        """
+        decodes one entry of the term table
+        :param slot: the position of the term in sorted order
+        :return: a (term offset, term length, postings offset, count, highest
+        relevance) tuple
+        """
+        return WORDS_ENTRY.unpack_from(
+            self.mm, self.table_offset + WORDS_ENTRY.size * slot)
+
+    def _term(self, slot: int):
+        """
+        :param slot: the position of the term in sorted order
+        :return: the utf-8 bytes of the term at that position
+        """
+        term_offset, length, _, _, _ = self._entry(slot)
+        start = self.blob_offset + term_offset
+        return self.mm[start:start + length]
+
+    def find(self, word: str):
+        """
+        binary searches the sorted term table for a word
+        :param word: the word to look up
+        :return: the slot of the word, or -1 if it is not in the index
+        """
+        term = word.encode("utf-8")
+        low, high = 0, self.num_terms
+        while low < high:
+            mid = (low + high) // 2
+            if self._term(mid) < term:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.num_terms and self._term(low) == term:
+            return low
+        return -1
+
+    def __contains__(self, word: str):
+        return self.find(word) != -1
+
+    def postings(self, slot: int):
+        """
+        decodes the postings of the term at a slot
+        :param slot: the position of the term in sorted order
+        :return: a tuple of the typed arrays of ids and term relevances
+        """
+        _, _, offset, count, _ = self._entry(slot)
+        if self.version == WORDS_COMPRESSED:
+            return self._decode_compressed(offset, count)
+        ids = array("q")
+        ids.frombytes(self.mm[offset:offset + 8 * count])
+        relevances = array("d")
+        relevances.frombytes(self.mm[offset + 8 * count:offset + 16 * count])
+        return _to_little_endian(ids), _to_little_endian(relevances)
+
+    def _decode_compressed(self, offset: int, count: int):
+        """
+        decodes count varint (gap, quantized relevance) pairs starting at offset
+        and maps the doc numbers back to ids
+        :param offset: where the postings of the term start in the file
+        :param count: the number of postings of the term
+        :return: a tuple of the typed arrays of ids and term relevances
+        """
+        mm = self.mm
+        doc_ids = self.doc_ids
+        scale = self.scale
+        ids = array("q")
+        relevances = array("d")
+        number = 0
+        for _ in range(count):
+            value = shift = 0
+            while True:
+                byte = mm[offset]
+                offset += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            number += value
+            value = shift = 0
+            while True:
+                byte = mm[offset]
+                offset += 1
+                value |= (byte & 0x7F) << shift
+                if byte < 0x80:
+                    break
+                shift += 7
+            ids.append(doc_ids[number])
+            relevances.append(value / scale)
+        return ids, relevances
+
+    def max_relevance(self, slot: int):
+        """
+        :param slot: the position of the term in sorted order
+        :return: the highest term relevance in the postings of the term
+        """
+        return self._entry(slot)[4]
+
+    def accumulate(self, words: list):
+        """
+        adds up the term relevances of words for every document that has any
+        of them, the same way as Postings.accumulate
+        :param words: a list of words, where a word that is in it more than
+        once is added that many times
+        :return: a tuple of numpy arrays of the sorted ids of the documents and
+        their summed term relevances
+        """
+        id_parts = []
+        relevance_parts = []
+        for word in words:
+            slot = self.find(word)
+            if slot != -1:
+                ids, relevances = self.postings(slot)
+                id_parts.append(np.frombuffer(ids, dtype=np.int64))
+                relevance_parts.append(
+                    np.frombuffer(relevances, dtype=np.float64))
+        return sum_relevances(id_parts, relevance_parts)
+
+    def get(self, word: str, default=None):
+        """
+        looks up the postings of a word the same way as a words_to_doc_relevance
+        dictionary would
+        :param word: the word to look up
+        :param default: what to return if the word is not in the index
+        :return: a dictionary of ids to term relevance, or default
+        """
+        slot = self.find(word)
+        if slot == -1:
+            return default
+        ids, relevances = self.postings(slot)
+        return dict(zip(ids, relevances))
+
+    def __getitem__(self, word: str):
+        ids_to_relevance = self.get(word)
+        if ids_to_relevance is None:
+            raise KeyError(word)
+        return ids_to_relevance
+
+    def close(self):
+        if isinstance(self.doc_ids, memoryview):
+            self.doc_ids.release()
+        self.mm.close()
+        self.words_fh.close()
+
+
+def write_lexicon_file(lexicon: str, terms):
+    """
+    Writes a sorted, front-coded lexicon of every term with its document
+    frequency and its slot in the words file, so that a querier can find the
+    terms that start with a prefix by binary search instead of scanning the
+    whole vocabulary
+    :param lexicon: the file that will get written to
+    :param terms: an iterable of (word, document frequency, slot) tuples,
+    where the slot is the line of the word in a text words file or its
+    position in the term table of a binary one
+    :return: n/a
+    """
+    terms = sorted((word.encode("utf-8"), doc_freq, slot)
+                   for word, doc_freq, slot in terms)
+    num_blocks = (len(terms) + LEXICON_BLOCK_SIZE - 1) // LEXICON_BLOCK_SIZE
+    blocks = []
+    for start in range(0, len(terms), LEXICON_BLOCK_SIZE):
+        block = bytearray()
+        previous = b""
+        for term, doc_freq, slot in terms[start:start + LEXICON_BLOCK_SIZE]:
+            shared = 0
+            limit = min(len(previous), len(term))
+            while shared < limit and previous[shared] == term[shared]:
+                shared += 1
+            _encode_varint(shared, block)
+            _encode_varint(len(term) - shared, block)
+            block += term[shared:]
+            _encode_varint(doc_freq, block)
+            _encode_varint(slot, block)
+            previous = term
+        blocks.append(bytes(block))
+
+    offset = LEXICON_HEADER.size + 8 * num_blocks
+    block_offsets = array("Q")
+    for block in blocks:
+        block_offsets.append(offset)
+        offset += len(block)
+    with open_for_replace(lexicon, "wb") as lexicon_fh:
+        lexicon_fh.write(LEXICON_HEADER.pack(LEXICON_MAGIC, LEXICON_VERSION,
+                                             len(terms), LEXICON_BLOCK_SIZE,
+                                             num_blocks))
+        lexicon_fh.write(_to_little_endian(block_offsets).tobytes())
+        for block in blocks:
+            lexicon_fh.write(block)
+
+
+class BinaryTitles(Mapping):
+    """
+    Read-only view of a binary titles file, which acts like the dictionary of
+    ids to titles it replaces. The file is memory-mapped and an id is found
+    by binary search of the id table, so opening it takes constant time and
+    only the titles that are looked up are decoded.
+    """
+
+    def __init__(self, titles: str):
+        """
+        opens and memory-maps the binary titles file
+        :param titles: the file name that the binary titles file was written to
+        :return: n/a
+        """
+        self.titles = titles
+        self.titles_fh = open(titles, "rb")
+        self.mm = mmap.mmap(self.titles_fh.fileno(), 0,
+                            access=mmap.ACCESS_READ)
+        magic, version, self.num_docs = TITLES_HEADER.unpack_from(self.mm, 0)
+        if magic != TITLES_MAGIC or version != TITLES_VERSION:
+            raise IOError("Not a binary titles file: " + titles)
+        ids_offset = TITLES_HEADER.size
+        offsets_offset = ids_offset + 8 * self.num_docs
+        self.blob_offset = offsets_offset + 8 * (self.num_docs + 1)
+        if sys.byteorder == "little":
+            self.ids = memoryview(self.mm)[ids_offset:offsets_offset].cast("q")
+            self.offsets = memoryview(self.mm)[
+                offsets_offset:self.blob_offset].cast("Q")
+        else:
+            self.ids = array("q")
+            self.ids.frombytes(self.mm[ids_offset:offsets_offset])
+            self.ids.byteswap()
+            self.offsets = array("Q")
+            self.offsets.frombytes(self.mm[offsets_offset:self.blob_offset])
+            self.offsets.byteswap()
+
+    def __getstate__(self):
+        # the mmap can't be pickled, so other processes open the file again
+        return self.titles
+
+    def __setstate__(self, titles: str):
+        self.__init__(titles)
+
+    def find(self, id_num: int):
+        """
+        :param id_num: the id of a document
+        :return: the dense doc number of the id, or -1 if it isn't a document
+        """
+        number = bisect_left(self.ids, id_num)
+        if number < self.num_docs and self.ids[number] == id_num:
+            return number
+        return -1
+
+    def title(self, number: int):
+        """
+        :param number: a dense doc number
+        :return: the title of the document
+        """
+        start = self.blob_offset + self.offsets[number]
+        end = self.blob_offset + self.offsets[number + 1]
+        return self.mm[start:end].decode("utf-8")
+
+    def __getitem__(self, id_num: int):
+        number = self.find(id_num)
+        if number == -1:
+            raise KeyError(id_num)
+        return self.title(number)
+
+    def __contains__(self, id_num: int):
+        return self.find(id_num) != -1
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __len__(self):
+        return self.num_docs
+
+    def close(self):
+        if isinstance(self.ids, memoryview):
+            self.ids.release()
+            self.offsets.release()
+        self.mm.close()
+        self.titles_fh.close()
+
+
+class Lexicon:
+    """
+    Read-only view of a lexicon file. The file is memory-mapped, the first
+    term of each block is binary searched to find where a prefix would be,
+    and only the blocks holding terms with the prefix are decoded.
+    """
+
+    def __init__(self, lexicon: str):
+        """
+        opens and memory-maps the lexicon file
+        :param lexicon: the file name that the lexicon was written to
+        :return: n/a
+        """
+        self.lexicon = lexicon
+        self.lexicon_fh = open(lexicon, "rb")
+        self.mm = mmap.mmap(self.lexicon_fh.fileno(), 0,
+                            access=mmap.ACCESS_READ)
+        magic, version, self.num_terms, self.block_size, self.num_blocks = \
+            LEXICON_HEADER.unpack_from(self.mm, 0)
+        if magic != LEXICON_MAGIC or version != LEXICON_VERSION:
+            raise IOError("Not a lexicon file: " + lexicon)
+        self.block_offsets = array("Q")
+        self.block_offsets.frombytes(self.mm[
+            LEXICON_HEADER.size:LEXICON_HEADER.size + 8 * self.num_blocks])
+        _to_little_endian(self.block_offsets)
+
+    def __len__(self):
+        return self.num_terms
+
+    def __getstate__(self):
+        # the mmap can't be pickled, so other processes open the file again
+        return self.lexicon
+
+    def __setstate__(self, lexicon: str):
+        self.__init__(lexicon)
+
+    def _first_term(self, block: int):
+        """
+        :param block: the number of a block
+        :return: the utf-8 bytes of the first term of the block, which is
+        stored whole
+        """
+        _, offset = _decode_varint(self.mm, self.block_offsets[block])
+        length, offset = _decode_varint(self.mm, offset)
+        return self.mm[offset:offset + length]
+
+    def _block(self, block: int):
+        """
+        decodes every term of a block
+        :param block: the number of a block
+        :return: a generator of (utf-8 bytes of the term, document frequency,
+        slot) tuples in sorted order
+        """
+        mm = self.mm
+        offset = self.block_offsets[block]
+        count = min(self.block_size, self.num_terms - block * self.block_size)
+        term = b""
+        for _ in range(count):
+            shared, offset = _decode_varint(mm, offset)
+            length, offset = _decode_varint(mm, offset)
+            term = term[:shared] + mm[offset:offset + length]
+            offset += length
+            doc_freq, offset = _decode_varint(mm, offset)
+            slot, offset = _decode_varint(mm, offset)
+            yield term, doc_freq, slot
+
+    def complete(self, prefix: str):
+        """
+        finds every term that starts with a prefix
+        :param prefix: the prefix, which may be a whole term
+        :return: a list of (term, document frequency, slot) tuples in sorted
+        order
+        """
+        prefix = prefix.encode("utf-8")
+        # the last block whose first term is before the prefix may end with
+        # terms that start with it
+        low, high = 0, self.num_blocks
+        while low < high:
+            mid = (low + high) // 2
+            if self._first_term(mid) < prefix:
+                low = mid + 1
+            else:
+                high = mid
+        completions = []
+        for block in range(max(low - 1, 0), self.num_blocks):
+            for term, doc_freq, slot in self._block(block):
+                if term.startswith(prefix):
+                    completions.append((term.decode("utf-8"), doc_freq, slot))
+                elif term > prefix:
+                    return completions
+        return completions
+
+    def close(self):
+        self.mm.close()
+        self.lexicon_fh.close()
+
+
+def open_words_file(words: str):
+    """
+    opens a words file in either format, memory-mapping it if it is a binary
+    words file and reading it into compact postings otherwise
+    :param words: the file name that the words file was written to
+    :return: a BinaryWordsIndex or a Postings of words to ids to term relevance
+    """
+    with open(words, "rb") as words_fh:
+        magic = words_fh.read(len(WORDS_MAGIC))
+    if magic == WORDS_MAGIC:
+        return BinaryWordsIndex(words)
+    return read_words_postings(words)
+
+
+def open_title_file(titles: str):
+    """
+    opens a titles file in either format, memory-mapping it if it is a binary
+    titles file and reading it into a dictionary otherwise
+    :param titles: the file name that the titles file was written to
+    :return: a BinaryTitles or a dictionary of ids to titles
+    """
+    with open(titles, "rb") as titles_fh:
+        magic = titles_fh.read(len(TITLES_MAGIC))
+    if magic == TITLES_MAGIC:
+        return BinaryTitles(titles)
+    ids_to_titles = {}
+    read_title_file(titles, ids_to_titles)
+    return ids_to_titles
+
+
 def read_title_file(titles: str, ids_to_titles: dict):
     """
     reads the id and titles written in titles into the ids_to_titles dictionary
@@ -87,6 +885,53 @@ def read_docs_file(docs: str, ids_to_pageranks: dict):
                 ids_to_pageranks[int(split[0])] = float(split[1])
 
 
+def read_tiers_file(tiers: str):
+    """
+    reads in the tiers file written by write_tiers_file
+    :param tiers: filepath to the tiers file
+    :return: the highest PageRank of a page in the tail tier
+    """
+    with open(tiers, "r") as tiers_fh:
+        return float(tiers_fh.readline())
+
+
+def _map_array(filepath: str, dtype: str, offset: int, count: int):
+    """
+    :param filepath: the file to map the array from
+    :param dtype: the numpy dtype of the array, with its byte order
+    :param offset: where the array starts in the file
+    :param count: the number of values in the array
+    :return: a read-only numpy array memory-mapped from the file
+    """
+    if count == 0:
+        # an empty array can't be mapped, since there is nothing to map
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(filepath, dtype=dtype, mode="r", offset=offset,
+                     shape=(count,))
+
+
+def read_graph_file(graph: str):
+    """
+    memory-maps the link graph written by write_graph_file
+    :param graph: filepath to the link graph file
+    :return: a tuple of read-only numpy arrays of the id of each dense doc
+    number and the CSR indptr and indices arrays of the link graph
+    """
+    with open(graph, "rb") as graph_fh:
+        header = graph_fh.read(GRAPH_HEADER.size)
+    if len(header) < GRAPH_HEADER.size:
+        raise IOError("Not a link graph file: " + graph)
+    magic, version, num_docs, num_links = GRAPH_HEADER.unpack(header)
+    if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+        raise IOError("Not a link graph file: " + graph)
+    ids_offset = GRAPH_HEADER.size
+    indptr_offset = ids_offset + 8 * num_docs
+    indices_offset = indptr_offset + 8 * (num_docs + 1)
+    return (_map_array(graph, "<i8", ids_offset, num_docs),
+            _map_array(graph, "<i8", indptr_offset, num_docs + 1),
+            _map_array(graph, "<i4", indices_offset, num_links))
+
+
 def read_words_file(words: str, words_to_doc_relevance: dict):
     """
     reads in the term relevance written in words into words_to_doc_relevance dictionary
@@ -107,4 +952,61 @@ def read_words_file(words: str, words_to_doc_relevance: dict):
                 relevance = float(split[i+1])
                 if word not in words_to_doc_relevance:
                     words_to_doc_relevance[word] = {}
-                words_to_doc_relevance[word][page_id] = relevance
\ No newline at end of file
+                words_to_doc_relevance[word][page_id] = relevance
+
+
+def read_words_postings(words: str):
+    """
+    reads in the term relevance written in words straight into compact
+    postings, without building a dictionary for each word first
+    :param words: the file name that the words_to_doc_frequency dictionary was written to
+    :return: a Postings of words to ids to term relevance
+    """
+    postings = Postings()
+    with open(words, "r") as words_fh:
+        for line in words_fh:
+            split = line.split()
+            if len(split) == 0:
+                continue
+            postings.add_term(split[0], map(int, split[1::2]),
+                              map(float, split[2::2]))
+    return postings
+
+
+def write_snapshot_file(snapshot: str, ids_to_titles: dict,
+                        ids_to_pageranks: dict, postings):
+    """
+    Writes everything the querier needs into one pickled snapshot, with the
+    postings kept in their compact arrays, so the querier can load it with a
+    single read instead of parsing the three text index files
+    :param snapshot: the file that will get written to
+    :param ids_to_titles: the dictionary of ids to titles
+    :param ids_to_pageranks: the dictionary of ids to pageranks
+    :param postings: the Postings of words to ids to term relevance, or the
+    Tiers of a tiered index
+    :return: n/a
+    """
+    state = {"version": SNAPSHOT_VERSION,
+             "ids_to_titles": {int(id_num): title
+                               for id_num, title in ids_to_titles.items()},
+             "ids_to_pageranks": {int(id_num): rank
+                                  for id_num, rank in ids_to_pageranks.items()},
+             "postings": postings}
+    with open_for_replace(snapshot, "wb") as snapshot_fh:
+        pickle.dump(state, snapshot_fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def read_snapshot_file(snapshot: str):
+    """
+    reads a snapshot written by write_snapshot_file in one bulk read
+    :param snapshot: the file name that the snapshot was written to
+    :return: a tuple of the dictionary of ids to titles, the dictionary of ids
+    to pageranks, and the Postings (or Tiers) of words to ids to term
+    relevance
+    """
+    with open(snapshot, "rb") as snapshot_fh:
+        state = pickle.loads(snapshot_fh.read())
+    if state.get("version") != SNAPSHOT_VERSION:
+        raise IOError("Unsupported index snapshot file")
+    return state["ids_to_titles"], state["ids_to_pageranks"], \
+        state["postings"]
@@ -1,15 +1,196 @@
+import argparse
+from array import array
+import collections
 import math
-import sys
+import multiprocessing
+import os
+import pickle
+import tempfile
 from pickle import STOP
 from file_io import write_title_file
+from file_io import write_title_binary_file
 from file_io import write_words_file
+from file_io import write_words_stream
+from file_io import write_words_binary_file
+from file_io import write_words_compressed_file
+from file_io import DEFAULT_PRECISION
 from file_io import write_docs_file
+from file_io import write_graph_file
+from file_io import open_for_replace
+from file_io import read_docs_file
+from file_io import write_snapshot_file
+from file_io import write_lexicon_file
+from file_io import shard_filepath
+from file_io import tier_filepath
+from file_io import tiers_filepath
+from file_io import write_tiers_file
 import re
 import xml.etree.ElementTree as et
-from nltk.stem import PorterStemmer
-from nltk.corpus import stopwords
-STOP_WORDS = set(stopwords.words('english'))
-nltk_test = PorterStemmer()
+import numpy as np
+import pagerank
+from postings import Postings, Tiers
+from instrumentation import Instrumentation
+from spimi import write_run, merge_runs
+from normalize import load_nltk, stem_stop
+
+N_REGEX = \
+    '''\[\[[^\[]+?\]\]|[a-zA-Z0-9]+'[a-zA-Z0-9]+|[a-zA-Z0-9]+'''
+
+# number of pages sent to a worker process at a time when indexing in parallel
+BATCH_SIZE = 64
+
+# version of the state file saved for incremental updates
+STATE_VERSION = 1
+
+# rough number of bytes one posting takes up in words_to_ids_to_term_relevance
+# while it is being built, which the memory budget is measured against
+POSTING_BYTES = 100
+
+
+def iter_pages(xml_filepath: str):
+    """
+    This function streams the pages of an XML document one at a time using
+    iterparse instead of building the whole tree in memory. Each page element
+    is cleared from the tree once the caller has moved on to the next page, so
+    memory use depends on the largest page rather than the size of the file.
+
+    Parameters:
+    xml_filepath: the string representing the filepath to the xml file
+
+    Returns:
+    A generator of the page elements that are direct children of the root
+    """
+
+    root = None
+    depth = 0
+    for event, elem in et.iterparse(xml_filepath, events=("start", "end")):
+        if event == "start":
+            if root is None:
+                root = elem
+            depth += 1
+        else:
+            depth -= 1
+            if depth == 1 and elem.tag == "page":
+                yield elem
+                # frees the page (and anything before it) once it's processed
+                root.clear()
+
+def page_fields(page):
+    """
+    This function extracts the id, title, and text of a page element, where
+    the text has the title in front of it as it is tokenized with the page
+
+    Parameters:
+    page: a page element from the XML document
+
+    Returns:
+    A tuple of the id, title, and text of the page
+    """
+
+    title = page.find('title').text.strip()
+    id = page.find('id').text.strip()
+    if page.find('text').text == None:
+        page_text = title
+    else:
+        page_text = title + " " + page.find('text').text.strip()
+    return id, title, page_text
+
+
+def tokenize(page_text: str, links: set):
+    """
+    This function tokenizes the text of a page in a single pass. Words outside
+    of links are yielded as they are found. For a link, only the text to the
+    right of the pipe (or the whole link if there is no pipe) is tokenized and
+    the title to the left of it is added to links. The words of links are
+    yielded after the rest of the text, starting from the last link, which is
+    the order the words of a page have always been counted in.
+
+    Parameters:
+    page_text: the text of the page
+    links: a set that the titles linked to are added to
+
+    Returns:
+    A generator of the words in the page
+    """
+
+    link_texts = []
+    for match in re.finditer(N_REGEX, page_text):
+        word = match.group()
+        if (word[0:2] == "[[" and "|" in word):
+            # Getting text to the right of pipe to use for tokenizing, and the
+            # text to the left of it as the title linked to
+            parts = word.split("|")
+            links.add(parts[0][2:])
+            link_texts.append(parts[1][:-2])
+        elif (word[0:2] == "[["):
+            links.add(word[2:-2])
+            link_texts.append(word[2:-2])
+        else:
+            yield word
+
+    for link_text in reversed(link_texts):
+        yield from re.findall(N_REGEX, link_text)
+
+
+def parse_page(title: str, page_text: str):
+    """
+    This function tokenizes the text of a page and finds the titles that it
+    links to. Links are kept whether or not the title is in the corpus, so
+    that they can be resolved again when pages are added later.
+
+    Parameters:
+    title: the title of the page, which it can't link to
+    page_text: the text of the page
+
+    Returns:
+    A tuple of the list of words in the page and the set of titles it links to
+    """
+
+    links = set()
+    words = list(tokenize(page_text, links))
+    links.discard(title)
+
+    # A page with no links to other pages in the corpus is treated by page_rank
+    # as linking to all of them
+    return words, links
+
+
+def count_terms(list_of_words: list):
+    """
+    This function counts the occurrences of each word in a list
+
+    Parameters:
+    list_of_words: A list of the stemmed words of a page
+
+    Returns:
+    A dictionary of each word to its count, in the order the words first
+    appear in the list
+    """
+
+    term_counts = {}
+    for word in list_of_words:
+        term_counts[word] = term_counts.get(word, 0) + 1
+    return term_counts
+
+
+def parse_batch(batch: list):
+    """
+    This function tokenizes, stems, and counts the terms of a batch of pages
+    in a worker process
+
+    Parameters:
+    batch: a list of (id, title, text) tuples of pages
+
+    Returns:
+    A list of (id, term counts, links) tuples, one for each page in the batch
+    """
+
+    results = []
+    for id, title, page_text in batch:
+        words, links = parse_page(title, page_text)
+        results.append((id, count_terms(stem_stop(words)), links))
+    return results
+
 
 class Index:
 
@@ -20,7 +201,18 @@ class Index:
     """
 
     def __init__(self, xml_filepath: str, titles_filepath: str,
-                 docs_filepath: str, words_filepath: str):
+                 docs_filepath: str, words_filepath: str,
+                 streaming: bool = False, words_format: str = "text",
+                 workers: int = 1, state_filepath: str = None,
+                 incremental: bool = False,
+                 precision: int = DEFAULT_PRECISION,
+                 profile_filepath: str = None, memory_budget: int = None,
+                 spill_dirpath: str = None, snapshot_filepath: str = None,
+                 shards: int = 1, pagerank_solver: str = "power",
+                 warm_start_filepath: str = None,
+                 lexicon_filepath: str = None, titles_format: str = "text",
+                 high_tier: float = None, graph_filepath: str = None,
+                 trace_memory: bool = False):
         """ 
         This is the constructor for the Index class. It initializes the XML,
         titles, docs, words, and roots fields, and calls the parse_xml function,
@@ -32,6 +224,55 @@ class Index:
         titles_filepath: the string representing the filepath to the titles file
         docs_filepath: the string representing the filepath to the docs file
         words_filepath: the string representing the filepath to the words file
+        streaming: a boolean, true if the XML should be streamed page by page
+        in two passes instead of being loaded into a tree
+        words_format: "text" to write the words file as text, "binary" to
+        write it as a sorted term table with packed postings that the querier
+        can memory-map, or "compressed" to write the postings of the binary
+        format over dense doc numbers with varint gaps and quantized relevance
+        workers: the number of processes to tokenize and stem pages with
+        state_filepath: the string representing the filepath to save the
+        per-page term counts and links to, which incremental updates need
+        incremental: a boolean, true if xml_filepath is a delta of added,
+        changed, and deleted pages to apply to the index saved in
+        state_filepath rather than a whole corpus
+        precision: the number of decimal places of term relevance kept in a
+        compressed words file
+        profile_filepath: the string representing the filepath to write a
+        JSON report of the time and memory each phase took to, or None to not
+        record them
+        memory_budget: the number of bytes the term frequencies being built
+        may take up before they are spilled to a run file on disk, or None to
+        build the whole index in memory
+        spill_dirpath: the string representing the directory to write run
+        files to, or None for the system's temporary directory
+        snapshot_filepath: the string representing the filepath to write a
+        query-ready snapshot of all three index files to, or None to not
+        write one
+        shards: the number of shards to split the pages into. With more than
+        one, each shard gets its own titles, docs, words, and snapshot files,
+        named by shard_filepath, in place of the unsharded ones, and so does
+        the lexicon
+        pagerank_solver: the pagerank.SOLVERS solver to rank pages with
+        warm_start_filepath: the string representing the filepath to a docs
+        file whose rankings PageRank starts from instead of 1/n, or None
+        lexicon_filepath: the string representing the filepath to write a
+        sorted lexicon of the terms to, which the querier expands prefix
+        queries with, or None to not write one
+        titles_format: "text" to write the titles file as text, or "binary"
+        to write it as a table of offsets into the titles by dense doc number
+        that the querier can memory-map
+        high_tier: the fraction of the pages with the highest PageRank whose
+        postings go in a high-authority tier, with the rest in a tail tier,
+        each written to its own words file named by tier_filepath along with
+        a tiers file named by tiers_filepath, or None to write one words
+        file. It can't be used with more than one shard or with a lexicon.
+        graph_filepath: the string representing the filepath to write the
+        link graph PageRank was run over to, which pagerank.py can rank the
+        pages from again without the XML, or None to not write one
+        trace_memory: a boolean, true if the JSON report should also have
+        the peak traced Python memory of each phase, which slows the build
+        down enough that its times can't be compared with an untraced build
 
         Returns:
         None
@@ -40,23 +281,316 @@ class Index:
         self.title_to_id = {}
         self.id_to_title = {}
         self.page_to_links = {}
+        self.link_graph = None
         self.words_to_ids_to_term_relevance = {}
         self.ids_to_page_ranks = {}
-        self.weights = {}
+        self.page_term_counts = {}
+        self.term_idf = {}
+        self.xml_filepath = xml_filepath
+        self.streaming = streaming
+        self.workers = workers
+        self.pagerank_solver = pagerank_solver
+        self.titles_format = titles_format
+        self.state_filepath = state_filepath
+        self.memory_budget = memory_budget
+        self.spill_dirpath = spill_dirpath
+        self.spill_directory = None
+        self.run_filepaths = []
+        self.doc_freqs = {}
+        self.reset_term_counts()
+        self.buffered_postings = 0
+        self.root = None
+        self.instrumentation = Instrumentation(profile_filepath is not None,
+                                               trace_memory)
+        phase = self.instrumentation.phase
 
         try:
-            self.root = et.parse(xml_filepath).getroot()
-            self.populate_id_and_title_dicts()
-            self.parse_xml()
-            write_title_file(titles_filepath, self.id_to_title)
-            write_words_file(words_filepath,
-                             self.words_to_ids_to_term_relevance)
-            write_docs_file(docs_filepath, self.ids_to_page_ranks)
+            if not streaming:
+                with phase("xml_parse"):
+                    self.root = et.parse(xml_filepath).getroot()
+            previous_ranks = None
+            if warm_start_filepath is not None or incremental:
+                previous_ranks = {}
+                if warm_start_filepath is None and shards > 1:
+                    # a sharded index only has the docs files of its shards
+                    for shard in range(shards):
+                        read_docs_file(shard_filepath(docs_filepath, shard),
+                                       previous_ranks)
+                else:
+                    read_docs_file(warm_start_filepath or docs_filepath,
+                                   previous_ranks)
+            if incremental:
+                with phase("load_state"):
+                    self.load_state()
+                with phase("update_pages"):
+                    self.update_pages(previous_ranks)
+            else:
+                with phase("populate_id_and_title_dicts"):
+                    self.populate_id_and_title_dicts()
+                with phase("parse_xml"):
+                    self.parse_xml(previous_ranks)
+            # only a single text words file can be written straight from the
+            # runs, since the binary formats, the snapshot, and the shards
+            # need every term up front
+            stream_words = memory_budget is not None and shards == 1 and \
+                words_format == "text" and snapshot_filepath is None and \
+                high_tier is None
+            if memory_budget is not None and not stream_words:
+                with phase("merge_runs"):
+                    postings = Postings()
+                    for word, ids, relevances in self.merged_postings():
+                        postings.add_term(word, ids, relevances)
+                    self.words_to_ids_to_term_relevance = postings
+            if shards > 1:
+                self.write_shards(shards, titles_filepath, docs_filepath,
+                                  words_filepath, words_format, precision,
+                                  snapshot_filepath, lexicon_filepath)
+            else:
+                with phase("write_title_file"):
+                    self.write_titles(titles_filepath, self.id_to_title)
+                with phase("write_words_file"):
+                    if stream_words:
+                        write_words_stream(words_filepath,
+                                           self.merged_postings())
+                    elif high_tier is not None:
+                        self.words_to_ids_to_term_relevance = \
+                            self.write_tiers(words_filepath, words_format,
+                                             precision, high_tier)
+                    else:
+                        self.write_words(words_filepath, words_format,
+                                         self.words_to_ids_to_term_relevance,
+                                         list(self.id_to_title), precision)
+                if lexicon_filepath is not None:
+                    with phase("write_lexicon_file"):
+                        if stream_words:
+                            # the words file has a line per word in the
+                            # order the words first appeared
+                            write_lexicon_file(lexicon_filepath, (
+                                (word, doc_freq, self.term_ranks[word])
+                                for word, doc_freq in self.doc_freqs.items()))
+                        else:
+                            self.write_lexicon(
+                                lexicon_filepath, words_format,
+                                self.words_to_ids_to_term_relevance)
+                with phase("write_docs_file"):
+                    write_docs_file(docs_filepath, self.ids_to_page_ranks)
+                if snapshot_filepath is not None:
+                    with phase("write_snapshot_file"):
+                        write_snapshot_file(
+                            snapshot_filepath, self.id_to_title,
+                            self.ids_to_page_ranks,
+                            self.words_to_ids_to_term_relevance)
+            if graph_filepath is not None:
+                with phase("write_graph_file"):
+                    write_graph_file(graph_filepath, *self.link_graph)
+            if self.spill_directory is not None:
+                self.spill_directory.cleanup()
+            if state_filepath is not None:
+                with phase("save_state"):
+                    self.save_state()
+            self.instrumentation.count("pages", len(self.id_to_title))
+            self.instrumentation.count("terms", len(self.term_idf))
+            self.instrumentation.count(
+                "postings", sum(self.doc_freqs.values())
+                if memory_budget is not None else
+                self.words_to_ids_to_term_relevance.num_postings())
+            if profile_filepath is not None:
+                self.instrumentation.write(profile_filepath)
         except FileNotFoundError as e:
             print("File was not found")
         except IOError as e:
             print("Error reading in file.")
 
+    def write_titles(self, titles_filepath: str, id_to_title: dict):
+        """
+        This function writes a titles file in the format given to the
+        constructor
+
+        Parameters:
+        titles_filepath: the string representing the filepath to the titles
+        file
+        id_to_title: a dictionary of the ids of pages to their titles
+
+        Returns:
+        None
+        """
+
+        if self.titles_format == "binary":
+            write_title_binary_file(titles_filepath, id_to_title)
+        else:
+            write_title_file(titles_filepath, id_to_title)
+
+    def write_words(self, words_filepath: str, words_format: str,
+                    postings: Postings, doc_ids: list, precision: int):
+        """
+        This function writes postings to a words file in the given format
+
+        Parameters:
+        words_filepath: the string representing the filepath to the words file
+        words_format: "text", "binary", or "compressed"
+        postings: the Postings of words to ids to term relevance to write
+        doc_ids: the ids of the pages the postings are over, in the order to
+        number them in a compressed words file
+        precision: the number of decimal places of term relevance kept in a
+        compressed words file
+
+        Returns:
+        None
+        """
+
+        if words_format == "binary":
+            write_words_binary_file(words_filepath, postings)
+        elif words_format == "compressed":
+            write_words_compressed_file(words_filepath, postings, doc_ids,
+                                        precision)
+        else:
+            write_words_file(words_filepath, postings)
+
+    def write_tiers(self, words_filepath: str, words_format: str,
+                    precision: int, high_tier: float):
+        """
+        This function sorts the pages by descending PageRank, splits the
+        postings into a high-authority tier of the first high_tier of them
+        and a tail tier of the rest, and writes the words file of each tier
+        and a tiers file with the highest PageRank in the tail tier. A
+        compressed words file numbers its pages in the same order, so its
+        doc numbers go by descending PageRank.
+
+        Parameters:
+        words_filepath: the words filepath to name the tiers' words files
+        after
+        words_format: "text", "binary", or "compressed"
+        precision: the number of decimal places of term relevance kept in a
+        compressed words file
+        high_tier: the fraction of the pages in the high-authority tier
+
+        Returns:
+        The Tiers of the postings
+        """
+
+        ids = sorted(self.id_to_title,
+                     key=lambda id: (-self.ids_to_page_ranks[id], int(id)))
+        num_high = math.ceil(high_tier * len(ids))
+        tier_of = {int(id): 0 if rank < num_high else 1
+                   for rank, id in enumerate(ids)}
+        with self.instrumentation.phase("partition_postings"):
+            tiers = self.words_to_ids_to_term_relevance.partition(tier_of, 2)
+        for tier, tier_ids in enumerate((ids[:num_high], ids[num_high:])):
+            self.write_words(tier_filepath(words_filepath, tier),
+                             words_format, tiers[tier], tier_ids, precision)
+        # the pages are sorted by PageRank, so the first of the tail's has the
+        # highest
+        tail_page_rank = self.ids_to_page_ranks[ids[num_high]] \
+            if num_high < len(ids) else 0
+        write_tiers_file(tiers_filepath(words_filepath), tail_page_rank)
+        return Tiers(tiers, tail_page_rank)
+
+    def write_lexicon(self, lexicon_filepath: str, words_format: str,
+                      postings: Postings):
+        """
+        This function writes the lexicon of the words in postings, with the
+        document frequency of each word and its slot in the words file
+        written from postings in the given format
+
+        Parameters:
+        lexicon_filepath: the string representing the filepath to the lexicon
+        words_format: "text", "binary", or "compressed"
+        postings: the Postings of words to ids to term relevance
+
+        Returns:
+        None
+        """
+
+        offsets = postings.offsets
+        if words_format == "text":
+            slots = postings.slots
+        else:
+            # the term table of a binary words file is sorted the same way
+            # as the lexicon
+            slots = {word: position for position, word in enumerate(
+                sorted(postings.slots, key=lambda word: word.encode("utf-8")))}
+        write_lexicon_file(lexicon_filepath, (
+            (word, offsets[slot + 1] - offsets[slot], slots[word])
+            for word, slot in postings.slots.items()))
+
+    def write_shards(self, shards: int, titles_filepath: str,
+                     docs_filepath: str, words_filepath: str,
+                     words_format: str, precision: int,
+                     snapshot_filepath: str = None,
+                     lexicon_filepath: str = None):
+        """
+        This function splits the pages into shards, dealing them out in turn
+        in page order, and writes the index files of each shard. The term
+        relevances and PageRanks are the ones calculated over the whole
+        corpus, so every shard scores its pages exactly the way the unsharded
+        index would.
+
+        Parameters:
+        shards: the number of shards
+        titles_filepath: the titles filepath to name the shards' titles files
+        after
+        docs_filepath: the docs filepath to name the shards' docs files after
+        words_filepath: the words filepath to name the shards' words files
+        after
+        words_format: "text", "binary", or "compressed"
+        precision: the number of decimal places of term relevance kept in a
+        compressed words file
+        snapshot_filepath: the snapshot filepath to name the shards' snapshots
+        after, or None to not write snapshots
+        lexicon_filepath: the lexicon filepath to name the shards' lexicons
+        after, or None to not write lexicons
+
+        Returns:
+        None
+        """
+
+        phase = self.instrumentation.phase
+        ids = list(self.id_to_title)
+        shard_of = {int(id): k % shards for k, id in enumerate(ids)}
+        with phase("partition_postings"):
+            shard_postings = self.words_to_ids_to_term_relevance.partition(
+                shard_of, shards)
+        for shard in range(shards):
+            shard_ids = ids[shard::shards]
+            id_to_title = {id: self.id_to_title[id] for id in shard_ids}
+            ids_to_page_ranks = {id: self.ids_to_page_ranks[id]
+                                 for id in shard_ids}
+            with phase("write_title_file"):
+                self.write_titles(shard_filepath(titles_filepath, shard),
+                                  id_to_title)
+            with phase("write_words_file"):
+                self.write_words(shard_filepath(words_filepath, shard),
+                                 words_format, shard_postings[shard],
+                                 shard_ids, precision)
+            with phase("write_docs_file"):
+                write_docs_file(shard_filepath(docs_filepath, shard),
+                                ids_to_page_ranks)
+            if snapshot_filepath is not None:
+                with phase("write_snapshot_file"):
+                    write_snapshot_file(
+                        shard_filepath(snapshot_filepath, shard),
+                        id_to_title, ids_to_page_ranks, shard_postings[shard])
+            if lexicon_filepath is not None:
+                with phase("write_lexicon_file"):
+                    self.write_lexicon(shard_filepath(lexicon_filepath, shard),
+                                       words_format, shard_postings[shard])
+
+    def pages(self):
+        """
+        This function returns the pages of the corpus, either from the parsed
+        tree or by streaming them from the XML file
+
+        Parameters:
+        None
+
+        Returns:
+        An iterable of page elements
+        """
+
+        if self.streaming:
+            return iter_pages(self.xml_filepath)
+        return self.root.findall("page")
+
     def populate_id_and_title_dicts(self):
         """
         This function populates both the id_to_title and title_to_id
@@ -70,21 +604,54 @@ class Index:
         """
 
         # for loop to populate ID to title and title to ID dictionaries
-        all_pages = self.root.findall("page")
-        for page in all_pages:
+        for page in self.pages():
             # extracts the title and ID from the page and adds it to dictionary
             title = page.find('title').text.strip()
             id = page.find('id').text.strip()
             self.id_to_title[id] = title
             self.title_to_id[title] = id
 
-    def parse_xml(self):
+    def parse_xml(self, previous_ranks: dict = None):
+        """
+        This function will call the tokenize, stem, and remove stop word
+        functions for all text in each page in the corpus, either serially or
+        spread over a pool of worker processes. This function will also call
+        the term relevance and page rank methods to calculate those values.
+
+        Parameters:
+        previous_ranks: A dictionary of ids to rankings to start PageRank
+        from, or None to start from 1/n
+
+        Returns:
+        None
+        """
+
+        phase = self.instrumentation.phase
+        if self.workers > 1:
+            self.parse_xml_parallel()
+        else:
+            # for loop to tokenize, remove stop words, and stem text on each
+            # page
+            # timed as a whole, since a phase per page would add up to more
+            # than the work it times
+            with phase("tokenize_and_stem"):
+                for page in self.pages():
+                    id, title, page_text = page_fields(page)
+                    words, links = parse_page(title, page_text)
+                    term_counts = count_terms(stem_stop(words))
+                    self.page_to_links[id] = links
+                    self.add_term_counts(term_counts, id)
+        with phase("calculate_term_relevance"):
+            self.calculate_term_relevance()
+        self.page_rank(previous_ranks)
+
+    def parse_xml_parallel(self):
         """
-        This function populates both the title to ID and ID to title
-        dictionaries and will also call the tokenize, stem, and remove stop
-        word functions for all text in each page in the corpus. This function
-        will also call the term relevance and page rank methods to calculate
-        those values.
+        This function sends batches of pages to a pool of worker processes that
+        tokenize, stem, and count the terms of each page, and merges the
+        results back in page order so the index files are identical to a
+        serial run. Only a few batches are in flight at a time so that
+        streaming the XML still bounds memory.
 
         Parameters:
         None
@@ -93,67 +660,28 @@ class Index:
         None
         """
 
-        # for loop to tokenize, remove stop words, and stem text on each page
-        all_pages = self.root.findall("page")
-        for page in all_pages:
-            title = page.find('title').text.strip()
-            id = page.find('id').text.strip()
-            self.page_to_links[id] = []
-            no_links = True
+        def merge(results):
+            for id, term_counts, links in results:
+                self.page_to_links[id] = links
+                self.add_term_counts(term_counts, id)
 
-            if page.find('text').text == None:
-                page_text = title
-            else:
-                page_text = title + " " + page.find('text').text.strip()
-            n_regex = \
-                '''\[\[[^\[]+?\]\]|[a-zA-Z0-9]+'[a-zA-Z0-9]+|[a-zA-Z0-9]+'''
-
-            # Initializes a list of all words in the text of a page
-            words = re.findall(n_regex, page_text)
-
-            # Goes through each link and only takes the right part of pipe
-            for i in range(len(words) - 1, -1, -1):
-                word = words[i]
-                if (word[0:2] == "[[" and "|" in word):
-                    # Getting text to the right of pipe to use for tokenizing
-                    right_of_pipe = word.split("|")[1]
-                    words.pop(i)
-                    words = words + \
-                        re.findall(
-                            n_regex, right_of_pipe[0:len(right_of_pipe) - 2])
-
-                    # Getting text to the left of pipe to populate page_to_links
-                    # dictionary
-                    left_of_pipe = word.split("|")[0][2:]
-                    if (left_of_pipe in self.title_to_id and left_of_pipe not
-                            in self.page_to_links[id] and left_of_pipe !=
-                            self.id_to_title[id]):
-                        # checks if the link is in corpus and doesn't add if
-                        # it's already in there to avoid duplicates
-                        self.page_to_links[id].append(left_of_pipe)
-                        no_links = False
-
-                elif (word[0:2] == "[["):
-                    words.pop(i)
-                    words = words + re.findall(n_regex, word[2: len(word) - 2])
-                    # Populating the page_to_links dict
-                    if (word[2: len(word) - 2] in self.title_to_id and
-                            word[2: len(word) - 2] not in
-                            self.page_to_links[id] and word[2: len(word) - 2]
-                            != self.id_to_title[id]):
-                        self.page_to_links[id].append(word[2: len(word) - 2])
-                        no_links = False
-
-            # If the page contains no links, page_to_links is populated with
-            # all other pages in corpus except itself
-            if (no_links == True):
-                self.page_to_links[id] = [title for title in
-                                          self.title_to_id.keys()
-                                          if title != self.id_to_title[id]]
-            words = self.stem_stop(words)
-            self.calculate_term_frequency(words, id)
-        self.calculate_term_relevance()
-        self.page_rank()
+        # loaded before forking so the workers don't each import nltk
+        load_nltk()
+        with self.instrumentation.phase("tokenize_and_stem"), \
+                multiprocessing.Pool(self.workers) as pool:
+            pending = collections.deque()
+            batch = []
+            for page in self.pages():
+                batch.append(page_fields(page))
+                if len(batch) == BATCH_SIZE:
+                    pending.append(pool.apply_async(parse_batch, (batch,)))
+                    batch = []
+                    if len(pending) >= 2 * self.workers:
+                        merge(pending.popleft().get())
+            if batch:
+                pending.append(pool.apply_async(parse_batch, (batch,)))
+            while pending:
+                merge(pending.popleft().get())
 
     def stem_stop(self, list_of_words: list):
         """
@@ -167,19 +695,13 @@ class Index:
         A list of strings in which each string in the list has been stemmed
         and all the stop words have been removed
         """
-        list_of_words = [x.lower() for x in list_of_words]
-        for i in range(len(list_of_words)-1, -1, -1):
-            if list_of_words[i] in STOP_WORDS:
-                list_of_words.remove(list_of_words[i])
-            else:
-                list_of_words[i] = nltk_test.stem(list_of_words[i])
-        return list_of_words
+        return stem_stop(list_of_words)
 
     def calculate_term_frequency(self, list_of_words: list, id: int):
         """
-        This function populates the words_to_ids_to_term_relevance dictionary
-        by finding the counts of each word in a document and then looping
-        through and dividing each entry by aj.
+        This function finds the counts of each word in a document and adds
+        them to the index with add_term_counts, which divides each count by
+        aj.
 
         Parameters:
         list_of_words: A list of strings containing all the words in a 
@@ -190,145 +712,453 @@ class Index:
         None
         """
 
-        # Initializes the max occurrences of a term in a page to be 0
-        # (will be updated later)
-        aj = 0
+        self.add_term_counts(count_terms(list_of_words), id)
 
-        # populate the self.ids_to_term_relevance dict at a word with the term
-        # counts for the current page
-        for word in list_of_words:
-            if word in self.words_to_ids_to_term_relevance:
-                if id in self.words_to_ids_to_term_relevance[word]:
-                    count = self.words_to_ids_to_term_relevance[word][id] + 1
-                    self.words_to_ids_to_term_relevance[word][id] = count
-                else:
-                    count = 1
-                    self.words_to_ids_to_term_relevance[word][id] = 1
+    def reset_term_counts(self):
+        """
+        This function empties the flat arrays of (term, page, count) triples
+        that add_term_counts appends to when the index is built in memory.
+        Each page's triples are contiguous, so only the id and the number of
+        distinct words of each page are stored rather than an id per triple.
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+
+        self.term_ranks = {}
+        self.posting_terms = array("q")
+        self.posting_counts = array("q")
+        self.page_ids = array("q")
+        self.page_lengths = array("q")
+
+    def add_term_counts(self, term_counts: dict, id: int):
+        """
+        This function adds the term counts of a page to the index. When the
+        index is built in memory, they are appended to flat arrays that
+        calculate_term_relevance turns into term relevances in one vectorized
+        pass. Otherwise, the term frequency of each word, which is the count
+        of the word divided by aj, the count of the most frequent word in the
+        page, is added to the words_to_ids_to_term_relevance dictionary to be
+        spilled to a run file.
+
+        Parameters:
+        term_counts: A dictionary of each word in a page to its count, in the
+        order the words first appear
+        id: an int representing the page id of the term_counts
+
+        Returns:
+        None
+        """
 
+        if self.state_filepath is not None:
+            self.page_term_counts[id] = term_counts
+        if len(term_counts) == 0:
+            return
+        if self.memory_budget is None:
+            term_ranks = self.term_ranks
+            for word in term_counts:
+                if word not in term_ranks:
+                    term_ranks[word] = len(term_ranks)
+            self.posting_terms.extend(map(term_ranks.__getitem__, term_counts))
+            self.posting_counts.extend(term_counts.values())
+            self.page_ids.append(int(id))
+            self.page_lengths.append(len(term_counts))
+            return
+        aj = max(term_counts.values())
+        for word, count in term_counts.items():
+            if word in self.words_to_ids_to_term_relevance:
+                self.words_to_ids_to_term_relevance[word][id] = count/aj
             else:
-                count = 1
-                self.words_to_ids_to_term_relevance[word] = {id: count}
+                self.words_to_ids_to_term_relevance[word] = {id: count/aj}
+        for word in term_counts:
+            if word not in self.term_ranks:
+                self.term_ranks[word] = len(self.term_ranks)
+            self.doc_freqs[word] = self.doc_freqs.get(word, 0) + 1
+        self.buffered_postings += len(term_counts)
+        if self.buffered_postings * POSTING_BYTES >= self.memory_budget:
+            self.spill()
 
-            if count > aj:
-                aj = count
+    def spill(self):
+        """
+        This function writes the term frequencies built since the last spill
+        to a new run file, sorted by the order each word first appeared in the
+        corpus, and empties the words_to_ids_to_term_relevance dictionary
 
-        # change the term counts in self.words_to_ids_to_term_relevance to term
-        # frequency by dividing all by aj
-        for word in list(set(list_of_words)):
-            for current_pg_id in self.words_to_ids_to_term_relevance[word]:
-                if id == current_pg_id:
-                    self.words_to_ids_to_term_relevance[word][id] = \
-                        self.words_to_ids_to_term_relevance[word][id]/aj
+        Parameters:
+        None
 
-    def calculate_term_relevance(self):
+        Returns:
+        None
         """
-        This function populates the words_to_ids_to_term_relevance dictionary
-        by looping through the keys in the words_to_ids_to_term_relevance 
-        dictionary and calculating the term relevance for a particular word
+
+        if self.spill_directory is None:
+            self.spill_directory = tempfile.TemporaryDirectory(
+                prefix="spimi-", dir=self.spill_dirpath)
+        run_filepath = os.path.join(self.spill_directory.name,
+                                    "run%d" % len(self.run_filepaths))
+        with self.instrumentation.phase("spill"):
+            write_run(run_filepath, self.words_to_ids_to_term_relevance,
+                      self.term_ranks)
+        self.run_filepaths.append(run_filepath)
+        self.instrumentation.count("runs", len(self.run_filepaths))
+        self.words_to_ids_to_term_relevance = {}
+        self.buffered_postings = 0
+
+    def merged_postings(self):
+        """
+        This function spills whatever term frequencies are left and merges
+        every run file into the final postings, multiplying each term
+        frequency by the inverse document frequency of its word
 
         Parameters:
         None
 
+        Returns:
+        A generator of (word, ids, term relevances) tuples, in the order the
+        words first appeared in the corpus and with ids in increasing order,
+        the same as the postings of an index built in memory
+        """
+
+        if len(self.words_to_ids_to_term_relevance) > 0 or \
+                self.spill_directory is None:
+            self.spill()
+        for word, ids, term_frequencies in merge_runs(self.run_filepaths):
+            idf = self.term_idf[word]
+            postings = sorted(zip(map(int, ids), term_frequencies))
+            yield word, [id for id, _ in postings], \
+                [tf * idf for _, tf in postings]
+
+    def calculate_term_relevance(self, affected_words: set = None):
+        """
+        This function builds the compact Postings of words to ids to term
+        relevance from the flat arrays of (term, page, count) triples in one
+        batched pass: the count of the most frequent word of each page and
+        the inverse document frequency of each word are calculated once each,
+        and every term frequency and term relevance is then calculated at
+        once with numpy. The triples are sorted by word and id to lay the
+        postings out the way Postings stores them. The values are exactly
+        the ones calculating them a posting at a time in Python would give.
+
+        Parameters:
+        affected_words: A set of the words whose document frequency may have
+        changed since term_idf was last calculated, or None if every word's
+        inverse document frequency should be calculated again
+
         Returns:
         None
         """
 
         num_of_docs = len(self.id_to_title)
-        for word in self.words_to_ids_to_term_relevance.keys():
-            for id in self.words_to_ids_to_term_relevance[word].keys():
-                if id in self.words_to_ids_to_term_relevance[word]:
-                    self.words_to_ids_to_term_relevance[word][id] = \
-                        self.words_to_ids_to_term_relevance[word][id] * \
-                        math.log((
-                            num_of_docs /
-                            len(self.words_to_ids_to_term_relevance[word])), 10)
+        if self.memory_budget is not None:
+            # the term frequencies are on disk, so the inverse document
+            # frequencies are applied as the runs are merged
+            self.term_idf = {word: math.log((num_of_docs / doc_freq), 10)
+                             for word, doc_freq in self.doc_freqs.items()}
+            return
+        words = list(self.term_ranks)
+        terms = np.frombuffer(self.posting_terms, dtype=np.int64)
+        counts = np.frombuffer(self.posting_counts, dtype=np.int64)
+        page_lengths = np.frombuffer(self.page_lengths, dtype=np.int64)
+        ids = np.repeat(np.frombuffer(self.page_ids, dtype=np.int64),
+                        page_lengths)
+        term_frequencies = np.zeros(0)
+        if len(page_lengths) > 0:
+            # no page has zero words, so no segment of reduceat is empty
+            page_starts = np.cumsum(page_lengths) - page_lengths
+            aj = np.repeat(np.maximum.reduceat(counts, page_starts),
+                           page_lengths)
+            term_frequencies = counts / aj
+        doc_freqs = np.bincount(terms, minlength=len(words))
+
+        # math.log rather than np.log10 so the values are the same as before
+        term_idf = {}
+        for word, doc_freq in zip(words, doc_freqs.tolist()):
+            if affected_words is None or word in affected_words or \
+                    word not in self.term_idf:
+                term_idf[word] = math.log((num_of_docs / doc_freq), 10)
+            else:
+                term_idf[word] = self.term_idf[word]
+        idfs = np.array([term_idf[word] for word in words], dtype=np.float64)
+
+        order = np.lexsort((ids, terms))
+        terms = terms[order]
+        offsets = np.concatenate(([0], np.cumsum(doc_freqs)))
+        self.words_to_ids_to_term_relevance = Postings.from_arrays(
+            words, offsets, ids[order],
+            term_frequencies[order] * idfs[terms])
+        self.term_idf = term_idf
+        self.reset_term_counts()
 
-    def euclidean_distance(self, prev_rankings: dict, current_rankings: dict):
+    def build_link_graph(self, ids: list):
         """
-        This function calculates the Euclidean distance between the 2 ranking 
-        vectors and returns the Euclidean distance.
+        This function converts page_to_links into a sparse link graph over
+        dense page numbers, where page k is the kth id in ids
 
         Parameters:
-        prev_rankings: A dictionary that represents the previous iteration of 
-        rankings and maps from doc ids to rankings
+        ids: A list of all the page ids in the corpus
+
+        Returns:
+        A tuple of the CSR indptr and indices arrays of the link graph
+        """
+
+        position = {id: k for k, id in enumerate(ids)}
+        out_links = []
+        for id in ids:
+            out_links.append([position[self.title_to_id[title]]
+                              for title in self.page_to_links[id]
+                              if title in self.title_to_id])
+        return pagerank.build_csr(out_links)
 
-        current_rankings: A dictionary that represents the current iteration of 
-        rankings for the pages and maps from doc ids to rankings
+    def page_rank(self, previous_ranks: dict = None):
+        """
+        This function calculates the page rankings of all the pages in the 
+        corpus and stores them in the ids_to_page_ranks dictionary, and keeps
+        the link graph it ranked them over in link_graph
+
+        Parameters:
+        previous_ranks: A dictionary of ids to the rankings from an earlier
+        index to start from, where pages that aren't in it start at 1/n
 
         Returns:
-        float representing the Euclidean distance between the two vectors
+        None
         """
 
-        sum = 0
-        for id in prev_rankings.keys():
-            sum = sum + (current_rankings[id] - prev_rankings[id]) ** 2
-        return sum ** 0.5
+        ids = list(self.id_to_title.keys())
+        with self.instrumentation.phase("build_link_graph"):
+            indptr, indices = self.build_link_graph(ids)
+        self.instrumentation.count("links", len(indices))
+        self.link_graph = (ids, indptr, indices)
+        initial = None
+        if previous_ranks is not None:
+            initial = pagerank.warm_start(ids, previous_ranks)
+        with self.instrumentation.phase("page_rank"):
+            ranks = pagerank.page_rank(
+                indptr, indices, initial=initial,
+                residuals=self.instrumentation.residuals,
+                solver=self.pagerank_solver)
+        self.instrumentation.solver = self.pagerank_solver
+        self.ids_to_page_ranks = dict(zip(ids, ranks.tolist()))
 
-    def find_weight(self, len_of_pages: int):
+    def save_state(self):
         """
-        This function returns the weight of a page by using a formula that 
-        takes into account the total number of pages and the number of unique 
-        pages that link to the page
+        This function saves what is needed to update the index later without
+        parsing the whole corpus again: the titles, the term counts and links
+        of each page, and the inverse document frequency of each word
 
         Parameters:
-        len_of_pages: The total number of pages in the corpus represented by an
-        int
+        None
 
         Returns:
-        The weight of a particular page represented as a float
+        None
         """
 
-        for k in self.id_to_title.keys():
-            # Filtered list of pages with duplicate pages removed
-            links_lst = self.page_to_links[k]
-            self.weights[k] = {}
-            for j in self.id_to_title.keys():
-                # If k has a link to j
-                if j != k and self.id_to_title[j] in links_lst:
-                    self.weights[k][j] = 0.15 / \
-                        len_of_pages + 0.85/len(links_lst)
+        state = {"version": STATE_VERSION,
+                 "id_to_title": self.id_to_title,
+                 "page_term_counts": self.page_term_counts,
+                 "page_to_links": self.page_to_links,
+                 "term_idf": self.term_idf}
+        with open_for_replace(self.state_filepath, "wb") as state_fh:
+            pickle.dump(state, state_fh, protocol=pickle.HIGHEST_PROTOCOL)
 
-                # Otherwise (if j equals k or if k does NOT have a link to j)
-                else:
-                    self.weights[k][j] = 0.15/len_of_pages
+    def load_state(self):
+        """
+        This function loads the state saved by save_state of an earlier index
+
+        Parameters:
+        None
 
-    def page_rank(self):
+        Returns:
+        None
         """
-        This function calculates the page rankings of all the pages in the 
-        corpus and stores them in the current rankings dictionary
+
+        with open(self.state_filepath, "rb") as state_fh:
+            state = pickle.load(state_fh)
+        if state.get("version") != STATE_VERSION:
+            raise IOError("Unsupported index state file")
+        self.id_to_title = state["id_to_title"]
+        self.title_to_id = {title: id for id, title in
+                            self.id_to_title.items()}
+        self.page_term_counts = state["page_term_counts"]
+        self.page_to_links = state["page_to_links"]
+        self.term_idf = state["term_idf"]
+
+    def update_pages(self, previous_ranks: dict):
+        """
+        This function applies a delta XML of pages to a loaded index state. A
+        page with a new id is added, a page with an existing id replaces that
+        page, and a page element with a deleted="true" attribute removes the
+        page with its id. Only pages in the delta are tokenized, the inverse
+        document frequency is only calculated again for words whose document
+        frequency changed (or for every word if the number of pages changed),
+        and PageRank starts from the previous rankings.
 
         Parameters:
-        pages: A list that contains all the pages in the corpus
+        previous_ranks: A dictionary of ids to the rankings in the docs file
+        of the index being updated
 
         Returns:
         None
         """
 
-        self.find_weight(len(self.title_to_id))
+        num_before = len(self.id_to_title)
+        affected_words = set()
 
-        # Initializes every rank in previous rankings dictionary to be 0
-        prev_ids_to_page_ranks = {}
-        prev_ids_to_page_ranks = prev_ids_to_page_ranks.fromkeys(
-            self.id_to_title.keys(), 0)
+        # first pass applies the deletions and the titles of added pages
+        for page in self.pages():
+            id = page.find('id').text.strip()
+            affected_words.update(self.page_term_counts.pop(id, {}))
+            self.page_to_links.pop(id, None)
+            if page.get("deleted") == "true":
+                self.id_to_title.pop(id, None)
+            else:
+                self.id_to_title[id] = page.find('title').text.strip()
+        self.title_to_id = {title: id for id, title in
+                            self.id_to_title.items()}
 
-        # Initializes every ranking in current rankings to be 1/n
-        self.ids_to_page_ranks = {}
-        self.ids_to_page_ranks = self.ids_to_page_ranks.fromkeys(
-            self.id_to_title.keys(), 1/len(self.id_to_title))
-
-        # Loop that continues to run as long as distance between 2 iterations
-        # is above threshold
-        while (self.euclidean_distance(prev_ids_to_page_ranks,
-                                       self.ids_to_page_ranks) > 0.001):
-            prev_ids_to_page_ranks = self.ids_to_page_ranks.copy()
-            for j in self.id_to_title.keys():
-                self.ids_to_page_ranks[j] = 0
-                for k in self.id_to_title.keys():
-                    self.ids_to_page_ranks[j] = self.ids_to_page_ranks[j] + \
-                        self.weights[k][j] * prev_ids_to_page_ranks[k]
-            sum = 0
-            for i1 in self.ids_to_page_ranks.keys():
-                sum = sum + self.ids_to_page_ranks[i1]
+        # second pass tokenizes, stems, and counts the added and changed pages
+        for page in self.pages():
+            if page.get("deleted") == "true":
+                continue
+            id, title, page_text = page_fields(page)
+            if id not in self.id_to_title:
+                continue
+            words, links = parse_page(title, page_text)
+            self.page_to_links[id] = links
+            term_counts = count_terms(stem_stop(words))
+            self.page_term_counts[id] = term_counts
+            affected_words.update(term_counts)
+
+        self.words_to_ids_to_term_relevance = {}
+        self.reset_term_counts()
+        with self.instrumentation.phase("calculate_term_frequency"):
+            for id in self.id_to_title:
+                self.add_term_counts(self.page_term_counts[id], id)
+        if len(self.id_to_title) != num_before:
+            affected_words = None
+        with self.instrumentation.phase("calculate_term_relevance"):
+            self.calculate_term_relevance(affected_words)
+        self.page_rank(previous_ranks)
+
+def main():
+    """
+    This function reads in the command line arguments and builds the index
+    files for the given XML document
+
+    Parameters:
+    None
+
+    Returns:
+    None
+    """
+
+    parser = argparse.ArgumentParser(
+        description="Builds the titles, docs, and words index files")
+    parser.add_argument("xml_filepath")
+    parser.add_argument("titles_filepath")
+    parser.add_argument("docs_filepath")
+    parser.add_argument("words_filepath")
+    parser.add_argument("--stream", action="store_true",
+                        help="stream the XML page by page instead of loading "
+                        "the whole document into memory")
+    parser.add_argument("--titles-format", choices=["text", "binary"],
+                        default="text",
+                        help="write the titles file as text, or as a table of "
+                        "offsets by dense doc number that the querier "
+                        "memory-maps and only decodes the titles of results "
+                        "from")
+    parser.add_argument("--words-format",
+                        choices=["text", "binary", "compressed"],
+                        default="text",
+                        help="write the words file as text, as a binary, "
+                        "memory-mappable index, or as a binary index with "
+                        "varint-compressed postings")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="decimal places of term relevance to keep in a "
+                        "compressed words file")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to tokenize and stem pages "
+                        "with")
+    parser.add_argument("--state", dest="state_filepath",
+                        help="file to save the per-page term counts and links "
+                        "to so the index can be updated incrementally")
+    parser.add_argument("--update", action="store_true",
+                        help="treat the XML as a delta of added, changed and "
+                        "deleted=\"true\" pages and apply it to the index "
+                        "saved in --state")
+    parser.add_argument("--memory-budget", type=float, metavar="MB",
+                        help="spill the postings being built to run files on "
+                        "disk whenever they take up about this many megabytes "
+                        "and merge the runs into the words file at the end; "
+                        "use with --stream to keep the XML out of memory too")
+    parser.add_argument("--spill-dir", dest="spill_dirpath",
+                        help="directory to write run files to, the system's "
+                        "temporary directory if not given")
+    parser.add_argument("--snapshot", dest="snapshot_filepath",
+                        help="also write a query-ready snapshot of all three "
+                        "index files that query.py --snapshot loads in one "
+                        "read")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="split the pages into this many shards, each "
+                        "with its own index files named like titles.0.txt, "
+                        "for query.py --shards")
+    parser.add_argument("--lexicon", dest="lexicon_filepath",
+                        help="also write a sorted, front-coded lexicon of the "
+                        "terms that query.py --lexicon expands prefix "
+                        "queries like comput* with")
+    parser.add_argument("--high-tier", type=float, metavar="FRACTION",
+                        help="split the postings into a tier of this fraction "
+                        "of the pages with the highest PageRank and a tail "
+                        "tier of the rest, written to words files named like "
+                        "words.tier0.txt with a words.tiers.txt file of the "
+                        "tail's highest PageRank, for query.py --tiered")
+    parser.add_argument("--graph", dest="graph_filepath",
+                        help="also write the link graph as memory-mappable "
+                        "CSR arrays, which pagerank.py ranks the pages from "
+                        "again without reparsing the XML")
+    parser.add_argument("--pagerank-solver", choices=pagerank.SOLVERS,
+                        default="power",
+                        help="power iteration, block Gauss-Seidel sweeps, or "
+                        "power iteration with quadratic extrapolation")
+    parser.add_argument("--warm-start", dest="warm_start_filepath",
+                        metavar="DOCS",
+                        help="start PageRank from the rankings in this docs "
+                        "file, such as the one from the last build")
+    parser.add_argument("--profile", dest="profile_filepath",
+                        help="write a JSON report of the wall time, CPU time, "
+                        "and peak memory of each indexing phase to this file")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="also trace Python allocations for --profile to "
+                        "report the peak traced memory of each phase, which "
+                        "makes the build several times slower")
+    args = parser.parse_args()
+    if args.update and args.state_filepath is None:
+        parser.error("--update requires --state")
+    if args.trace_memory and args.profile_filepath is None:
+        parser.error("--trace-memory requires --profile")
+    if args.high_tier is not None:
+        if not 0 < args.high_tier < 1:
+            parser.error("--high-tier must be between 0 and 1")
+        if args.shards > 1 or args.lexicon_filepath is not None:
+            parser.error("--high-tier can't be used with --shards or "
+                         "--lexicon")
+    Index(args.xml_filepath, args.titles_filepath, args.docs_filepath,
+          args.words_filepath, streaming=args.stream,
+          words_format=args.words_format, workers=args.workers,
+          state_filepath=args.state_filepath, incremental=args.update,
+          precision=args.precision, profile_filepath=args.profile_filepath,
+          memory_budget=None if args.memory_budget is None else
+          int(args.memory_budget * 1024 * 1024),
+          spill_dirpath=args.spill_dirpath,
+          snapshot_filepath=args.snapshot_filepath, shards=args.shards,
+          pagerank_solver=args.pagerank_solver,
+          warm_start_filepath=args.warm_start_filepath,
+          lexicon_filepath=args.lexicon_filepath,
+          titles_format=args.titles_format, high_tier=args.high_tier,
+          graph_filepath=args.graph_filepath,
+          trace_memory=args.trace_memory)
 
 if __name__ == "__main__":
-    i = Index(sys.argv[1], sys.argv[2], sys.argv[3], sys.argv[4])
\ No newline at end of file
+    main()
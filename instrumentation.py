@@ -0,0 +1,159 @@
+"""
+Provides per-phase timing and memory instrumentation for the indexer, so a
+slow or memory hungry build can be traced back to the phase that caused it
+"""
+
+import json
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+def max_rss_bytes():
+    """
+    :return: the peak resident memory of the process so far in bytes, or None
+    if the platform doesn't report it
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kilobytes and macOS reports bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+class Instrumentation:
+    """
+    Records the wall time, CPU time, and peak resident memory of named
+    phases, along with counts, the PageRank solver, and the residual of each
+    PageRank iteration. A phase that is entered more than once adds up its
+    times, and a phase entered inside another one counts towards both. When
+    it isn't enabled, phases cost nothing and nothing is recorded.
+    """
+
+    def __init__(self, enabled: bool = True, trace_memory: bool = False):
+        """
+        :param enabled: whether to record anything
+        :param trace_memory: whether to also trace Python memory allocations
+        to record the peak traced memory of each phase. Tracing slows down
+        allocation heavy code several times over, so the times recorded with
+        it are only good for comparing with each other.
+        :return: n/a
+        """
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.phases = {}
+        self.counts = {}
+        self.residuals = []
+        self.solver = None
+        self.stack = []
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def phase(self, name: str):
+        """
+        :param name: the name of the phase
+        :return: a context manager that records the phase while it is open
+        """
+        if not self.enabled:
+            return nullcontext()
+        if self.trace_memory:
+            return self._record_traced(name)
+        return self._record(name)
+
+    @contextmanager
+    def _record(self, name: str):
+        """
+        records one run of a phase
+        :param name: the name of the phase
+        :return: n/a
+        """
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            self._add(name, time.perf_counter() - wall_start,
+                      time.process_time() - cpu_start)
+
+    @contextmanager
+    def _record_traced(self, name: str):
+        """
+        records one run of a phase along with its peak traced memory.
+        tracemalloc only keeps one peak, so the
+        peak so far of the enclosing phase is saved before it is reset and
+        the enclosing phase's peak is at least the peak of this one
+        :param name: the name of the phase
+        :return: n/a
+        """
+        if self.stack:
+            self.stack[-1][1] = max(self.stack[-1][1],
+                                    tracemalloc.get_traced_memory()[1])
+        tracemalloc.reset_peak()
+        frame = [name, 0]
+        self.stack.append(frame)
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.process_time() - cpu_start
+            self.stack.pop()
+            peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+            if self.stack:
+                self.stack[-1][1] = max(self.stack[-1][1], peak)
+            phase = self._add(name, wall, cpu)
+            phase["peak_traced_bytes"] = max(
+                phase.get("peak_traced_bytes", 0), peak)
+
+    def _add(self, name: str, wall: float, cpu: float):
+        """
+        adds one run of a phase to its totals
+        :param name: the name of the phase
+        :param wall: the wall time of the run in seconds
+        :param cpu: the CPU time of the run in seconds
+        :return: the dictionary of the totals of the phase
+        """
+        phase = self.phases.setdefault(
+            name, {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0})
+        phase["calls"] += 1
+        phase["wall_s"] += wall
+        phase["cpu_s"] += cpu
+        phase["max_rss_bytes"] = max_rss_bytes()
+        return phase
+
+    def count(self, name: str, value: int):
+        """
+        records a count, such as the number of pages
+        :param name: the name of the count
+        :param value: the count
+        :return: n/a
+        """
+        if self.enabled:
+            self.counts[name] = value
+
+    def report(self):
+        """
+        :return: a dictionary of everything that was recorded
+        """
+        return {"phases": self.phases,
+                "counts": self.counts,
+                "pagerank": {"solver": self.solver,
+                             "iterations": len(self.residuals),
+                             "residuals": self.residuals},
+                "max_rss_bytes": max_rss_bytes()}
+
+    def write(self, report_filepath: str):
+        """
+        writes the report as JSON
+        :param report_filepath: the file to write the report to
+        :return: n/a
+        """
+        with open(report_filepath, "w") as report_fh:
+            json.dump(self.report(), report_fh, indent=2)
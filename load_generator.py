@@ -0,0 +1,141 @@
+"""
+Generates concurrent load against a querier started with query.py --serve:
+a number of clients each keep one query in flight at a time over their own
+connection until the requested number of queries have been answered. The
+throughput and the latency percentiles the clients saw are written as JSON,
+along with the statistics of the server, so that runs can be compared.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import sys
+import time
+from benchmark import percentiles
+from query import DEFAULT_PORT, read_batch_queries
+
+
+async def run_client(host: str, port: int, requests, latencies: list,
+                     counts: dict):
+    """
+    sends requests over one connection, one at a time, until there are none
+    left
+    :param host: the address of the server
+    :param port: the port of the server
+    :param requests: an iterator of request lines shared by every client
+    :param latencies: a list to add the latency of each request to, in seconds
+    :param counts: a dictionary of "errors" and "coalesced" to count into
+    :return: n/a
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for request in requests:
+            start = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            response = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - start)
+            if "error" in response:
+                counts["errors"] += 1
+            elif response.get("coalesced"):
+                counts["coalesced"] += 1
+    finally:
+        writer.close()
+
+
+async def server_stats(host: str, port: int):
+    """
+    :param host: the address of the server
+    :param port: the port of the server
+    :return: the statistics the server sends back for :stats
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(b":stats\n")
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+
+
+async def generate_load(host: str, port: int, lines: list, concurrency: int,
+                        num_requests: int):
+    """
+    runs the clients against the server and times them
+    :param host: the address of the server
+    :param port: the port of the server
+    :param lines: the request lines to send, which are cycled through
+    :param concurrency: the number of clients
+    :param num_requests: the number of requests to send in all
+    :return: a dictionary of the throughput, latency percentiles, error and
+    coalesced counts, and server statistics
+    """
+    requests = itertools.islice(itertools.cycle(lines), num_requests)
+    latencies = []
+    counts = {"errors": 0, "coalesced": 0}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, requests, latencies, counts)
+                           for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    results = {"concurrency": concurrency, "requests": len(latencies)}
+    results.update(counts)
+    results["elapsed_s"] = elapsed
+    results["queries_per_s"] = len(latencies) / elapsed if elapsed > 0 else 0
+    results["latency"] = percentiles(latencies)
+    results["server"] = await server_stats(host, port)
+    return results
+
+
+def main():
+    """
+    reads in the command line arguments, generates the load, and writes the
+    results as JSON
+    :return: n/a
+    """
+    parser = argparse.ArgumentParser(
+        description="Measures the throughput and tail latency of query.py "
+        "--serve under concurrent clients")
+    parser.add_argument("queries",
+                        help="file of queries, one per line or as JSONL like "
+                        "query.py --batch reads (- for stdin)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--concurrency", type=int, default=16,
+                        help="number of clients with a query in flight")
+    parser.add_argument("--requests", type=int, default=1000,
+                        help="number of queries to send in all, cycling "
+                        "through the file")
+    parser.add_argument("--pagerank", action="store_true",
+                        help="factor PageRank into queries that don't say")
+    parser.add_argument("--output", default="-",
+                        help="file to write the results to (default stdout)")
+    args = parser.parse_args()
+
+    if args.queries == "-":
+        requests = read_batch_queries(sys.stdin)
+    else:
+        with open(args.queries, "r") as queries_fh:
+            requests = read_batch_queries(queries_fh)
+    if len(requests) == 0:
+        parser.error("no queries in %s" % args.queries)
+    lines = []
+    for query, pagerank, extra in requests:
+        request = dict(extra, query=query,
+                       pagerank=args.pagerank if pagerank is None else
+                       pagerank)
+        lines.append((json.dumps(request) + "\n").encode())
+
+    results = asyncio.run(generate_load(args.host, args.port, lines,
+                                        args.concurrency, args.requests))
+    results["config"] = vars(args)
+    output = json.dumps(results, indent=2)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w") as output_fh:
+            output_fh.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Provides the stemming and stop word removal shared by the indexer and the
+querier, so that both turn words into terms exactly the same way
+"""
+
+import threading
+from functools import lru_cache
+
+# importing nltk takes a few hundred milliseconds, so the stop words and the
+# stemmer are loaded the first time they are needed instead of on import
+STOP_WORDS = None
+nltk_test = None
+nltk_lock = threading.Lock()
+
+# the most surface forms whose stems are remembered at a time
+STEM_CACHE_SIZE = 1 << 16
+
+
+def load_nltk():
+    """
+    Imports nltk and loads the stop words and the stemmer, if that hasn't
+    been done already. It is safe to call from a background thread to get the
+    import out of the way while waiting on something else.
+    :return: n/a
+    """
+    global STOP_WORDS, nltk_test
+    with nltk_lock:
+        if nltk_test is None:
+            from nltk.stem import PorterStemmer
+            from nltk.corpus import stopwords
+            STOP_WORDS = set(stopwords.words('english'))
+            nltk_test = PorterStemmer()
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def stem(word: str):
+    """
+    Stems a single lowercase word, remembering the stems of recently seen
+    words since the same few thousand forms make up most of any text
+    :param word: the word to stem
+    :return: the stem of the word
+    """
+    if nltk_test is None:
+        load_nltk()
+    return nltk_test.stem(word)
+
+
+def stem_stop(list_of_words: list):
+    """
+    Removes all stop words from a list of strings and stems each word (if
+    applicable) in the list
+    :param list_of_words: a list of words that has been tokenized already
+    :return: a list of strings in which each string in the list has been
+    lowercased and stemmed and all the stop words have been removed
+    """
+    if STOP_WORDS is None:
+        load_nltk()
+    return [stem(word) for word in (x.lower() for x in list_of_words)
+            if word not in STOP_WORDS]
+
+
+def cache_info():
+    """
+    :return: the hits, misses, maximum size and current size of the stem cache
+    """
+    return stem.cache_info()
@@ -0,0 +1,303 @@
+"""
+Provides a sparse PageRank engine that works over a link graph stored as
+compressed sparse row (CSR) arrays instead of a dense N x N weights table.
+Run as a script, it ranks the pages of a link graph file written by
+index.py --graph and writes a new docs file, without reparsing the XML.
+"""
+
+import argparse
+import numpy as np
+from file_io import read_docs_file, read_graph_file, write_docs_file
+from instrumentation import Instrumentation
+
+DAMPING = 0.85
+THRESHOLD = 0.001
+
+# the solvers page_rank can use
+SOLVERS = ("power", "gauss-seidel", "quadratic")
+
+# how many iterations quadratic extrapolation is applied after, counting the
+# one it is applied to
+EXTRAPOLATION_PERIOD = 5
+
+# how many blocks a Gauss-Seidel sweep updates the pages in, one after another
+GAUSS_SEIDEL_BLOCKS = 64
+
+
+def build_csr(out_links: list):
+    """
+    Builds the CSR arrays for a link graph given the out links of each page
+    output looks like:
+    indptr[k]..indptr[k+1] is the slice of indices holding the pages that
+    page k links to, sorted in increasing order
+    :param out_links: a list where entry k is an iterable of the dense ids
+    (0..n-1) of the pages that page k links to
+    :return: a tuple of the indptr and indices numpy arrays
+    """
+    indptr = np.zeros(len(out_links) + 1, dtype=np.int64)
+    targets = []
+    for k, links in enumerate(out_links):
+        row = sorted(set(links))
+        targets.extend(row)
+        indptr[k + 1] = indptr[k] + len(row)
+    indices = np.array(targets, dtype=np.int32)
+    return indptr, indices
+
+
+def warm_start(ids: list, previous_ranks: dict):
+    """
+    :param ids: a list of the id of each dense page number
+    :param previous_ranks: a dictionary of ids to the rankings from an
+    earlier index, where pages that aren't in it start at 1/n
+    :return: a numpy array of the rankings to start from, or None if there
+    are no pages
+    """
+    if len(ids) == 0:
+        return None
+    initial = np.array([previous_ranks.get(int(id), 1 / len(ids))
+                        for id in ids])
+    # the iteration keeps the total rank, so it has to start at 1
+    return initial / initial.sum()
+
+
+def page_rank(indptr: np.ndarray, indices: np.ndarray,
+              damping: float = DAMPING, threshold: float = THRESHOLD,
+              initial: np.ndarray = None, residuals: list = None,
+              solver: str = "power"):
+    """
+    Iterates over a CSR link graph until the euclidean distance between two
+    iterations is no more than the threshold. Teleportation is applied as a
+    single scalar per iteration and pages with no out links are treated as
+    linking to every other page, without either being stored
+    :param indptr: the CSR row pointer array of length n + 1
+    :param indices: the CSR array of link targets
+    :param damping: the probability of following a link instead of teleporting
+    :param threshold: the distance between iterations at which to stop
+    :param initial: the rankings to start from, uniform 1/n if not given
+    :param residuals: a list that the distance between each iteration and the
+    one before it is appended to, if given
+    :param solver: one of SOLVERS: "power" for power iteration,
+    "gauss-seidel" for block Gauss-Seidel sweeps that use the ranks updated
+    earlier in the same sweep, or "quadratic" for power iteration with
+    periodic quadratic extrapolation
+    :return: a numpy array of the rank of each page
+    """
+    n = len(indptr) - 1
+    if n == 0:
+        return np.zeros(0)
+    if initial is None:
+        ranks = np.full(n, 1 / n)
+    else:
+        ranks = np.asarray(initial, dtype=np.float64).copy()
+    if residuals is None:
+        residuals = []
+    if solver == "gauss-seidel":
+        return _gauss_seidel(indptr, indices, damping, threshold, ranks,
+                             residuals)
+    step = _power_step(indptr, indices, damping)
+    if solver == "quadratic":
+        return _quadratic(step, threshold, ranks, residuals)
+    if solver != "power":
+        raise ValueError("Unknown PageRank solver: " + solver)
+
+    residual = np.sqrt(np.sum(ranks ** 2))
+    while residual > threshold:
+        prev = ranks
+        ranks = step(prev)
+        residual = np.sqrt(np.sum((ranks - prev) ** 2))
+        residuals.append(float(residual))
+    return ranks
+
+
+def _power_step(indptr: np.ndarray, indices: np.ndarray, damping: float):
+    """
+    :param indptr: the CSR row pointer array of length n + 1
+    :param indices: the CSR array of link targets
+    :param damping: the probability of following a link instead of teleporting
+    :return: a function that takes the rankings of one iteration and returns
+    the rankings of the next
+    """
+    n = len(indptr) - 1
+    out_degree = np.diff(indptr)
+    dangling = out_degree == 0
+    # pages with no links spread over every page but themselves
+    others = max(n - 1, 1)
+    safe_degree = np.where(dangling, 1, out_degree)
+
+    def step(prev):
+        shares = np.repeat(damping * prev / safe_degree, out_degree)
+        linked = np.bincount(indices, weights=shares, minlength=n)
+        dangling_ranks = np.where(dangling, prev, 0.0)
+        spread = damping * (dangling_ranks.sum() - dangling_ranks) / others
+        return (1 - damping) / n * prev.sum() + linked + spread
+
+    return step
+
+
+def _quadratic(step, threshold: float, ranks: np.ndarray, residuals: list):
+    """
+    Runs power iteration, and every EXTRAPOLATION_PERIOD iterations replaces
+    the rankings with a quadratic extrapolation of the last four (Kamvar et
+    al.), which cancels out the slowest decaying error terms
+    :param step: the power iteration step from _power_step
+    :param threshold: the distance between iterations at which to stop
+    :param ranks: the rankings to start from
+    :param residuals: the list to append the distance of each iteration to
+    :return: a numpy array of the rank of each page
+    """
+    total = ranks.sum()
+    history = [ranks]
+    residual = np.sqrt(np.sum(ranks ** 2))
+    while residual > threshold:
+        prev = ranks
+        ranks = step(prev)
+        history.append(ranks)
+        if len(history) == EXTRAPOLATION_PERIOD:
+            extrapolated = _extrapolate(*history[-4:])
+            if extrapolated is not None:
+                ranks = extrapolated * (total / extrapolated.sum())
+            history = [ranks]
+        residual = np.sqrt(np.sum((ranks - prev) ** 2))
+        residuals.append(float(residual))
+    return ranks
+
+
+def _extrapolate(x0: np.ndarray, x1: np.ndarray, x2: np.ndarray,
+                 x3: np.ndarray):
+    """
+    :param x0: the rankings three iterations ago
+    :param x1: the rankings two iterations ago
+    :param x2: the rankings one iteration ago
+    :param x3: the latest rankings
+    :return: the quadratic extrapolation of the rankings, or None if the
+    differences between them are too degenerate to extrapolate from
+    """
+    differences = np.column_stack((x1 - x0, x2 - x0))
+    gammas, _, rank, _ = np.linalg.lstsq(differences, -(x3 - x0), rcond=None)
+    if rank < 2:
+        return None
+    gamma1, gamma2 = gammas
+    extrapolated = (gamma1 + gamma2 + 1) * x1 + (gamma2 + 1) * x2 + x3
+    if not np.all(np.isfinite(extrapolated)) or np.any(extrapolated < 0):
+        return None
+    return extrapolated
+
+
+def _gauss_seidel(indptr: np.ndarray, indices: np.ndarray, damping: float,
+                  threshold: float, ranks: np.ndarray, residuals: list):
+    """
+    Sweeps over the pages in GAUSS_SEIDEL_BLOCKS blocks, updating each block
+    from the ranks of its in links, which already include the blocks updated
+    earlier in the sweep. Each block is updated with numpy, so a sweep costs
+    about as much as a power iteration but converges in fewer sweeps.
+    :param indptr: the CSR row pointer array of length n + 1
+    :param indices: the CSR array of link targets
+    :param damping: the probability of following a link instead of teleporting
+    :param threshold: the distance between sweeps at which to stop
+    :param ranks: the rankings to start from
+    :param residuals: the list to append the distance of each sweep to
+    :return: a numpy array of the rank of each page
+    """
+    n = len(indptr) - 1
+    out_degree = np.diff(indptr)
+    dangling = out_degree == 0
+    others = max(n - 1, 1)
+    safe_degree = np.where(dangling, 1, out_degree)
+    # the links sorted by target, so the in links of a block are contiguous
+    order = np.argsort(indices)
+    sources = np.repeat(np.arange(n), out_degree)[order]
+    # the share of its source's rank that each link passes on
+    link_weights = damping / safe_degree[sources]
+    in_indptr = np.concatenate(
+        ([0], np.cumsum(np.bincount(indices, minlength=n))))
+    bounds = np.linspace(0, n, min(n, GAUSS_SEIDEL_BLOCKS) + 1).astype(int)
+    # each link's target counted from the start of the target's block
+    block_targets = indices[order] - np.repeat(bounds[:-1],
+                                               np.diff(in_indptr[bounds]))
+
+    total = ranks.sum()
+    residual = np.sqrt(np.sum(ranks ** 2))
+    while residual > threshold:
+        prev = ranks.copy()
+        ranks_sum = ranks.sum()
+        dangling_sum = ranks[dangling].sum()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            first, last = in_indptr[start], in_indptr[end]
+            shares = ranks[sources[first:last]] * link_weights[first:last]
+            linked = np.bincount(block_targets[first:last], weights=shares,
+                                 minlength=end - start)
+            old = ranks[start:end]
+            block_dangling = dangling[start:end]
+            dangling_ranks = np.where(block_dangling, old, 0.0)
+            new = (1 - damping) / n * ranks_sum + linked + \
+                damping * (dangling_sum - dangling_ranks) / others
+            ranks_sum += new.sum() - old.sum()
+            dangling_sum += new[block_dangling].sum() - dangling_ranks.sum()
+            ranks[start:end] = new
+        # a sweep doesn't keep the total rank the way power iteration does
+        ranks *= total / ranks.sum()
+        residual = np.sqrt(np.sum((ranks - prev) ** 2))
+        residuals.append(float(residual))
+    return ranks
+
+
+def main():
+    """
+    reads in the command line arguments, ranks the pages of the link graph,
+    and writes their rankings to a docs file
+    :return: n/a
+    """
+    parser = argparse.ArgumentParser(
+        description="Ranks the pages of a link graph written by index.py "
+        "--graph and writes a new docs file")
+    parser.add_argument("graph_filepath")
+    parser.add_argument("docs_filepath")
+    parser.add_argument("--damping", type=float, default=DAMPING,
+                        help="probability of following a link instead of "
+                        "teleporting")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD,
+                        help="distance between iterations at which to stop")
+    parser.add_argument("--solver", choices=SOLVERS, default="power",
+                        help="power iteration, block Gauss-Seidel sweeps, or "
+                        "power iteration with quadratic extrapolation")
+    parser.add_argument("--warm-start", dest="warm_start_filepath",
+                        metavar="DOCS",
+                        help="start from the rankings in this docs file, such "
+                        "as the one from the last build")
+    parser.add_argument("--profile", dest="profile_filepath",
+                        help="write a JSON report of the wall time, CPU time, "
+                        "and peak memory of each phase to this file")
+    args = parser.parse_args()
+    if not 0 < args.damping <= 1:
+        parser.error("--damping must be greater than 0 and at most 1")
+    if args.threshold <= 0:
+        parser.error("--threshold must be greater than 0")
+
+    instrumentation = Instrumentation(args.profile_filepath is not None)
+    try:
+        with instrumentation.phase("read_graph_file"):
+            ids, indptr, indices = read_graph_file(args.graph_filepath)
+            ids = ids.tolist()
+    except IOError as e:
+        parser.error(str(e))
+    instrumentation.count("pages", len(ids))
+    instrumentation.count("links", len(indices))
+    initial = None
+    if args.warm_start_filepath is not None:
+        previous_ranks = {}
+        read_docs_file(args.warm_start_filepath, previous_ranks)
+        initial = warm_start(ids, previous_ranks)
+    with instrumentation.phase("page_rank"):
+        ranks = page_rank(indptr, indices, damping=args.damping,
+                          threshold=args.threshold, initial=initial,
+                          residuals=instrumentation.residuals,
+                          solver=args.solver)
+    instrumentation.solver = args.solver
+    with instrumentation.phase("write_docs_file"):
+        write_docs_file(args.docs_filepath, dict(zip(ids, ranks.tolist())))
+    if args.profile_filepath is not None:
+        instrumentation.write(args.profile_filepath)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Provides a compact in-memory postings index that keeps every posting in a few
+flat typed arrays instead of a dictionary of dictionaries, so it takes about
+16 bytes per posting instead of well over 100
+"""
+
+from array import array
+from bisect import bisect_left
+from collections.abc import Mapping
+import numpy as np
+
+
+def sum_relevances(id_parts: list, relevance_parts: list):
+    """
+    adds up the term relevances of each document over the postings of several
+    terms at once. Each document's relevances are added in the order of the
+    parts, so the sums are exactly the ones adding them up a term at a time
+    would give
+    :param id_parts: a list of numpy arrays of the ids in each term's postings
+    :param relevance_parts: a list of numpy arrays of the term relevances, in
+    the same order
+    :return: a tuple of numpy arrays of the sorted ids of the documents and
+    their summed term relevances
+    """
+    if len(id_parts) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    # bincount adds the weights of each bin in the order they are given
+    unique_ids, positions = np.unique(np.concatenate(id_parts),
+                                      return_inverse=True)
+    sums = np.bincount(positions, weights=np.concatenate(relevance_parts),
+                       minlength=len(unique_ids))
+    return unique_ids, sums
+
+
+class PostingList(Mapping):
+    """
+    A read-only view of the postings of one term, which acts like the
+    dictionary of ids to term relevance it replaces. Ids are sorted, so
+    looking one up is a binary search.
+    """
+
+    __slots__ = ("ids", "relevances", "start", "end")
+
+    def __init__(self, ids: array, relevances: array, start: int, end: int):
+        """
+        :param ids: the ids array of the whole index
+        :param relevances: the term relevance array of the whole index
+        :param start: where the postings of the term start in the arrays
+        :param end: where the postings of the term end in the arrays
+        :return: n/a
+        """
+        self.ids = ids
+        self.relevances = relevances
+        self.start = start
+        self.end = end
+
+    def find(self, id: int):
+        """
+        :param id: the id of a document
+        :return: the position of the id in the arrays, or -1 if the term isn't
+        in the document
+        """
+        position = bisect_left(self.ids, id, self.start, self.end)
+        if position < self.end and self.ids[position] == id:
+            return position
+        return -1
+
+    def get(self, id: int, default=None):
+        # the same as find, inlined since scoring calls get far more often
+        ids = self.ids
+        position = bisect_left(ids, id, self.start, self.end)
+        if position < self.end and ids[position] == id:
+            return self.relevances[position]
+        return default
+
+    def __getitem__(self, id: int):
+        position = self.find(id)
+        if position == -1:
+            raise KeyError(id)
+        return self.relevances[position]
+
+    def __contains__(self, id: int):
+        return self.find(id) != -1
+
+    def __iter__(self):
+        return iter(self.ids[self.start:self.end])
+
+    def __len__(self):
+        return self.end - self.start
+
+    def values(self):
+        return self.relevances[self.start:self.end]
+
+    def items(self):
+        return zip(self.ids[self.start:self.end],
+                   self.relevances[self.start:self.end])
+
+
+class Postings(Mapping):
+    """
+    A compact, read-only index of words to ids to term relevance. The postings
+    of every term are stored back to back, sorted by id, in one array of ids
+    and a parallel array of term relevances, and a table maps each term to
+    its slot, which holds where its postings start and end. It acts like the
+    double dictionary it replaces and has the same find, postings, and
+    max_relevance lookups as file_io.BinaryWordsIndex.
+    """
+
+    def __init__(self):
+        """
+        makes an empty index, which add_term fills in
+        :return: n/a
+        """
+        self.slots = {}
+        self.offsets = array("q", [0])
+        self.ids = array("q")
+        self.relevances = array("d")
+        self.max_relevances = array("d")
+
+    @classmethod
+    def from_dict(cls, words_to_doc_relevance: dict):
+        """
+        builds the index from a double dictionary, emptying each dictionary of
+        ids to term relevance once it is copied so the two aren't both held in
+        full
+        :param words_to_doc_relevance: the dictionary of words -> ids -> term
+        relevance
+        :return: a Postings
+        """
+        postings = cls()
+        for word, ids_to_relevance in words_to_doc_relevance.items():
+            postings.add_term(word, ids_to_relevance.keys(),
+                              ids_to_relevance.values())
+            ids_to_relevance.clear()
+        return postings
+
+    @classmethod
+    def from_arrays(cls, words: list, offsets, ids, relevances):
+        """
+        builds the index straight from flat arrays that are already laid out
+        the way it stores them, without going through add_term a term at a
+        time
+        :param words: the list of the terms, in slot order
+        :param offsets: a numpy array of where the postings of each term
+        start, with the number of postings at the end
+        :param ids: a numpy array of ids, sorted within each term
+        :param relevances: a numpy array of term relevances, in the same order
+        as ids
+        :return: a Postings
+        """
+        postings = cls()
+        postings.slots = {word: slot for slot, word in enumerate(words)}
+        postings.offsets = array("q")
+        postings.offsets.frombytes(np.asarray(offsets, np.int64).tobytes())
+        postings.ids.frombytes(np.asarray(ids, np.int64).tobytes())
+        postings.relevances.frombytes(
+            np.asarray(relevances, np.float64).tobytes())
+        if len(words) > 0:
+            # every term has at least one posting, so no segment is empty
+            postings.max_relevances.frombytes(np.maximum.reduceat(
+                relevances, offsets[:-1]).astype(np.float64).tobytes())
+        return postings
+
+    def add_term(self, word: str, ids, relevances):
+        """
+        appends the postings of a term, which are sorted by id if they aren't
+        already. Terms are kept in the order they are added.
+        :param word: the term, which must not have been added already
+        :param ids: an iterable of the ids of the documents with the term, as
+        ints or strings of ints
+        :param relevances: an iterable of the term relevances, in the same
+        order as ids
+        :return: n/a
+        """
+        ids = array("q", map(int, ids))
+        relevances = array("d", relevances)
+        if list(ids) != sorted(ids):
+            pairs = sorted(zip(ids, relevances))
+            ids = array("q", (id for id, _ in pairs))
+            relevances = array("d", (relevance for _, relevance in pairs))
+        self.slots[word] = len(self.slots)
+        self.ids.extend(ids)
+        self.relevances.extend(relevances)
+        self.offsets.append(len(self.ids))
+        self.max_relevances.append(max(relevances, default=0.0))
+
+    def find(self, word: str):
+        """
+        :param word: the word to look up
+        :return: the slot of the word, or -1 if it is not in the index
+        """
+        return self.slots.get(word, -1)
+
+    def postings(self, slot: int):
+        """
+        :param slot: the slot of a term
+        :return: a tuple of the typed arrays of ids and term relevances
+        """
+        start, end = self.offsets[slot], self.offsets[slot + 1]
+        return self.ids[start:end], self.relevances[start:end]
+
+    def arrays(self, slot: int):
+        """
+        :param slot: the slot of a term
+        :return: a tuple of numpy arrays of the ids and term relevances of the
+        term, which are views of the index's arrays rather than copies
+        """
+        start, end = self.offsets[slot], self.offsets[slot + 1]
+        return (np.frombuffer(self.ids, dtype=np.int64)[start:end],
+                np.frombuffer(self.relevances, dtype=np.float64)[start:end])
+
+    def max_relevance(self, slot: int):
+        """
+        :param slot: the slot of a term
+        :return: the highest term relevance in the postings of the term
+        """
+        return self.max_relevances[slot]
+
+    def partition(self, shard_of: dict, num_shards: int):
+        """
+        splits the postings by document into one Postings per shard, keeping
+        the order of the terms and leaving out the terms a shard has no
+        documents with
+        :param shard_of: a dictionary of every id to the number of its shard
+        :param num_shards: the number of shards
+        :return: a list of the Postings of each shard
+        """
+        shards = [Postings() for _ in range(num_shards)]
+        for word, slot in self.slots.items():
+            start, end = self.offsets[slot], self.offsets[slot + 1]
+            ids = [[] for _ in range(num_shards)]
+            relevances = [[] for _ in range(num_shards)]
+            for id, relevance in zip(self.ids[start:end],
+                                     self.relevances[start:end]):
+                shard = shard_of[id]
+                ids[shard].append(id)
+                relevances[shard].append(relevance)
+            for shard in range(num_shards):
+                if len(ids[shard]) > 0:
+                    shards[shard].add_term(word, ids[shard], relevances[shard])
+        return shards
+
+    def accumulate(self, words: list):
+        """
+        adds up the term relevances of words for every document that has any
+        of them, in one vectorized pass. Each document's relevances are added
+        in the order of words, so the sums are exactly the ones adding them up
+        a word at a time would give
+        :param words: a list of words, where a word that is in it more than
+        once is added that many times
+        :return: a tuple of numpy arrays of the sorted ids of the documents and
+        their summed term relevances
+        """
+        id_parts = []
+        relevance_parts = []
+        for word in words:
+            slot = self.find(word)
+            if slot != -1:
+                ids, relevances = self.arrays(slot)
+                id_parts.append(ids)
+                relevance_parts.append(relevances)
+        return sum_relevances(id_parts, relevance_parts)
+
+    def num_postings(self):
+        """
+        :return: the number of postings of every term put together
+        """
+        return len(self.ids)
+
+    def __getitem__(self, word: str):
+        slot = self.slots[word]
+        return PostingList(self.ids, self.relevances, self.offsets[slot],
+                           self.offsets[slot + 1])
+
+    def __contains__(self, word: str):
+        return word in self.slots
+
+    def __iter__(self):
+        return iter(self.slots)
+
+    def __len__(self):
+        return len(self.slots)
+
+
+class Tiers:
+    """
+    The postings of an index split by document into tiers by PageRank: a
+    high-authority tier with the postings of the pages with the highest
+    PageRank and a tail tier with the postings of the rest. Every posting of
+    a page is in the page's tier, so a page's score can be added up from its
+    tier alone. Each tier is a Postings or a file_io.BinaryWordsIndex.
+    """
+
+    def __init__(self, tiers: list, tail_page_rank: float):
+        """
+        :param tiers: the high-authority tier and the tail tier
+        :param tail_page_rank: the highest PageRank of a page in the tail
+        tier, which the indexer records so the tail's postings don't have to
+        be read to find it
+        :return: n/a
+        """
+        self.tiers = tiers
+        self.tail_page_rank = tail_page_rank
+
+    def tail_bound(self, words: list):
+        """
+        :param words: a list of words, where a word that is in it more than
+        once counts that many times
+        :return: the highest sum of term relevances any page in the tail tier
+        can have for the words
+        """
+        tail = self.tiers[-1]
+        bound = 0
+        for word in words:
+            slot = tail.find(word)
+            if slot != -1:
+                bound += tail.max_relevance(slot)
+        return bound
+
+    def num_postings(self):
+        """
+        :return: the number of postings of every tier put together
+        """
+        return sum(tier.num_postings() for tier in self.tiers)
+
+    def close(self):
+        """
+        closes the tiers that are memory-mapped files
+        :return: n/a
+        """
+        for tier in self.tiers:
+            if hasattr(tier, "close"):
+                tier.close()
@@ -1,5 +1,12 @@
-from queue import PriorityQueue
+import argparse
+import collections
+import heapq
+import json
+import multiprocessing
+import os
 import sys
+import threading
+import time
 import file_io
 import sys
 from pickle import STOP
@@ -7,17 +14,36 @@ from file_io import write_title_file
 from file_io import write_words_file
 from file_io import write_docs_file
 import xml.etree.ElementTree as et
-from nltk.stem import PorterStemmer
-from nltk.corpus import stopwords
-STOP_WORDS = set(stopwords.words('english'))
-nltk_test = PorterStemmer()
+import numpy as np
+from collections import OrderedDict
+from normalize import load_nltk, stem_stop
+from postings import Postings, Tiers
+
+# the most query results the result cache of a QueryEngine holds at a time
+CACHE_SIZE = 1024
+
+# the most batch queries a ShardedQueryEngine sends to its shards before it
+# waits for the results of the oldest, so the shards are kept busy
+SHARD_WINDOW = 32
+
+# how much upper bounds on scores are raised by when pruning, so that rounding
+# differences in the order terms are added up in can't drop a document
+BOUND_SLACK = 1 + 1e-9
+
+# the port the query server listens on unless it is given another
+DEFAULT_PORT = 8765
+
+# the most terms a prefix query term like comput* is expanded into, which are
+# the ones with the prefix that are in the most documents
+PREFIX_EXPANSIONS = 16
 
 def main():
     """
-    This function reads in the number of arguments and determines whether to 
+    This function reads in the command line arguments and determines whether to 
     factor PageRank into the final rankings. It then passes data into the REPL
     to rank and print out the 10 most relevant pages (or if there are less than 
-    10 total pages, ranks the pages in the corpus).
+    10 total pages, ranks the pages in the corpus), or runs a file of queries
+    in batch mode.
 
     Parameters:
     None
@@ -26,41 +52,1058 @@ def main():
     None
     """
 
-    # Checks the number of arguments the user passes in and whether PageRank is
-    # to be included
-    if len(sys.argv) - 1 != 3 and len(sys.argv) - 1 != 4:
-        print("Invalid number of arguments")
-        sys.exit
-    elif sys.argv[1] == "--pagerank":
-        repl(True, sys.argv[2], sys.argv[3], sys.argv[4])
+    parser = argparse.ArgumentParser(
+        description="Answers queries against the index files")
+    parser.add_argument("--pagerank", action="store_true",
+                        help="factor PageRank into the rankings")
+    parser.add_argument("title_index", nargs="?")
+    parser.add_argument("doc_index", nargs="?")
+    parser.add_argument("word_index", nargs="?")
+    parser.add_argument("--snapshot",
+                        help="load the index from a snapshot written by "
+                        "index.py --snapshot instead of the three index files")
+    parser.add_argument("--shards", type=int, default=1,
+                        help="the index was split into this many shards by "
+                        "index.py --shards; each is searched by its own "
+                        "process")
+    parser.add_argument("--lexicon",
+                        help="the lexicon written by index.py --lexicon, "
+                        "which query terms ending in * are expanded with")
+    parser.add_argument("--tiered", action="store_true",
+                        help="the postings were split into PageRank tiers by "
+                        "index.py --high-tier; the tail tier is only searched "
+                        "when its pages could make the results")
+    parser.add_argument("--timing", action="store_true",
+                        help="print how long loading the index and answering "
+                        "the first query took")
+    parser.add_argument("--batch", metavar="QUERIES",
+                        help="run the queries in this file, one per line or "
+                        "as JSONL, instead of prompting for them (- for "
+                        "stdin)")
+    parser.add_argument("--output", default="-",
+                        help="file to write batch results to as JSONL "
+                        "(default stdout)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of processes to run batch or served "
+                        "queries with")
+    parser.add_argument("--serve", action="store_true",
+                        help="load the index once and answer queries from "
+                        "many clients at a time over TCP, one JSON request "
+                        "and response per line")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address for --serve to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT,
+                        help="port for --serve to listen on (0 picks a free "
+                        "one)")
+    args = parser.parse_args()
+    if args.snapshot is None and args.word_index is None:
+        parser.error("either the three index files or --snapshot is required")
+    if args.shards > 1 and args.workers > 1:
+        parser.error("--workers can't be used with --shards, which already "
+                     "answers each query with one process per shard")
+    if args.shards > 1 and args.tiered:
+        parser.error("--tiered can't be used with --shards")
+
+    if args.serve and args.batch is not None:
+        parser.error("--serve and --batch can't be used together")
+
+    if args.serve:
+        # imported here rather than at the top, since only the server needs
+        # asyncio and it slows down the start of every other way of querying
+        from server import serve
+        serve(args.pagerank, args.title_index, args.doc_index,
+              args.word_index, args.host, args.port, args.workers,
+              args.snapshot, args.shards, args.lexicon, args.tiered)
+    elif args.batch is not None:
+        run_batch(args.pagerank, args.title_index, args.doc_index,
+                  args.word_index, args.batch, args.output, args.workers,
+                  args.snapshot, args.shards, args.lexicon, args.tiered)
     else:
-        repl(False, sys.argv[1], sys.argv[2], sys.argv[3])
+        repl(args.pagerank, args.title_index, args.doc_index, args.word_index,
+             args.snapshot, args.timing, args.shards, args.lexicon,
+             args.tiered)
+
+class QueryEngine:
+
+    """
+    This is a class that holds the titles, docs, and words index files in
+    memory and answers queries by walking only the postings of the query terms
+    instead of scoring every document in the corpus. The results of recent
+    queries are kept in an LRU cache that is cleared whenever the index files
+    change on disk.
+    """
+
+    def __init__(self, title_index: str, doc_index: str, word_index: str,
+                 cache_size: int = CACHE_SIZE, prune: bool = True,
+                 snapshot: str = None, lexicon: str = None,
+                 tiered: bool = False):
+        """
+        This is the constructor for the QueryEngine class. It reads in the
+        ids_to_titles, ids_to_page_ranks, and term relevance dictionaries from
+        the index files via file_io, or opens the titles and words files
+        lazily if they are in the binary formats.
+
+        Parameters:
+        title_index: The filepath to the file that contains the IDs and titles
+        doc_index: The filepath to the docs file
+        word_index: The filepath that the words_to_doc_frequency dictionary was 
+        written to
+        cache_size: The most query results to cache, or 0 to not cache
+        prune: A boolean, true, if documents that can't make the top results
+        should be skipped, and false if every matching document is scored.
+        It doesn't apply to PageRank tiers, whose tail tier is skipped as a
+        whole instead.
+        snapshot: The filepath to a snapshot written by the indexer to load
+        instead of the three index files, or None
+        lexicon: The filepath to the lexicon written by the indexer to expand
+        prefix terms with, or None to not expand them
+        tiered: A boolean, true, if the postings were split into PageRank
+        tiers, whose words files are named after word_index by tier_filepath
+        and whose tiers file is named after it by tiers_filepath
+
+        Returns:
+        None
+        """
+
+        self.snapshot = snapshot
+        self.lexicon_filepath = lexicon
+        self.lexicon = None
+        if snapshot is not None:
+            self.index_files = (snapshot,)
+        elif tiered:
+            self.index_files = (title_index, doc_index,
+                                file_io.tier_filepath(word_index, 0),
+                                file_io.tier_filepath(word_index, 1),
+                                file_io.tiers_filepath(word_index))
+        else:
+            self.index_files = (title_index, doc_index, word_index)
+        self.cache_size = cache_size
+        self.prune = prune
+        self.cache = OrderedDict()
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.cache_evictions = 0
+        self.words_to_ids_to_term_relevance = {}
+        self.ids_to_titles = {}
+        self.load()
+
+    def index_signature(self):
+        """
+        This function finds the modification time and size of each index file,
+        which change whenever the indexer writes them again
+
+        Parameters:
+        None
+
+        Returns:
+        A tuple of (modification time, size) tuples of the index files
+        """
+
+        signature = []
+        filepaths = self.index_files
+        if self.lexicon_filepath is not None:
+            filepaths += (self.lexicon_filepath,)
+        for filepath in filepaths:
+            stat = os.stat(filepath)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def load(self):
+        """
+        This function reads in the index files and empties the result cache
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+
+        self.signature = self.index_signature()
+        if isinstance(self.words_to_ids_to_term_relevance,
+                      (file_io.BinaryWordsIndex, Tiers)):
+            self.words_to_ids_to_term_relevance.close()
+        if isinstance(self.ids_to_titles, file_io.BinaryTitles):
+            self.ids_to_titles.close()
+        if self.lexicon is not None:
+            self.lexicon.close()
+        if self.lexicon_filepath is not None:
+            self.lexicon = file_io.Lexicon(self.lexicon_filepath)
+        if self.snapshot is not None:
+            self.ids_to_titles, self.ids_to_page_ranks, \
+                self.words_to_ids_to_term_relevance = \
+                file_io.read_snapshot_file(self.snapshot)
+        else:
+            title_index, doc_index = self.index_files[:2]
+            self.ids_to_page_ranks = {}
+            file_io.read_docs_file(doc_index, self.ids_to_page_ranks)
+            # binary titles and words files are memory-mapped and decoded one
+            # title or term at a time
+            self.ids_to_titles = file_io.open_title_file(title_index)
+            if len(self.index_files) > 3:
+                # the tiers' words files and the tiers file
+                self.words_to_ids_to_term_relevance = Tiers(
+                    [file_io.open_words_file(word_index)
+                     for word_index in self.index_files[2:4]],
+                    file_io.read_tiers_file(self.index_files[4]))
+            else:
+                self.words_to_ids_to_term_relevance = \
+                    file_io.open_words_file(self.index_files[2])
+        self.max_page_rank = max(self.ids_to_page_ranks.values(), default=0)
+        # sorted ids and their PageRanks, for looking up many at once
+        self.page_rank_ids = np.fromiter(sorted(self.ids_to_page_ranks),
+                                         dtype=np.int64,
+                                         count=len(self.ids_to_page_ranks))
+        self.page_rank_values = np.array(
+            [self.ids_to_page_ranks[id] for id in self.page_rank_ids.tolist()],
+            dtype=np.float64)
+        self.cache.clear()
+
+    def cache_stats(self):
+        """
+        This function returns the statistics of the result cache
+
+        Parameters:
+        None
+
+        Returns:
+        A dictionary of the number of hits, misses, and evictions of the cache
+        and the number of results it holds
+        """
+
+        return {"hits": self.cache_hits, "misses": self.cache_misses,
+                "evictions": self.cache_evictions, "size": len(self.cache)}
+
+    def complete(self, prefix: str, k: int = PREFIX_EXPANSIONS):
+        """
+        This function finds the terms in the lexicon that start with a prefix
+        and are in the most documents
+
+        Parameters:
+        prefix: The start of a stemmed term
+        k: The most terms to return
+
+        Returns:
+        A list of up to k (term, document frequency) tuples from the most
+        documents to the fewest, which is empty if there is no lexicon
+        """
+
+        if self.lexicon is None:
+            return []
+        if self.index_signature() != self.signature:
+            self.load()
+        return top_completions(
+            [(term, doc_freq)
+             for term, doc_freq, _ in self.lexicon.complete(prefix)], k)
+
+    def search(self, list_of_words: list, use_pagerank: bool, k: int = 10):
+        """
+        This function answers a query from the result cache if it can, and
+        otherwise ranks the documents and caches the results. A query is
+        cached by its sorted terms, so queries with the same terms in a
+        different order share their results. The index files are reloaded
+        first if they have changed on disk.
+
+        Parameters:
+        list_of_words: A list of the stemmed, stop word free query terms
+        use_pagerank: A boolean, true, if the scores should be multiplied by
+        each document's PageRank, and false otherwise
+        k: The number of documents to return
+
+        Returns:
+        A list of up to k (score, id) tuples from best to worst, leaving out
+        documents with a score of 0
+        """
+
+        if self.index_signature() != self.signature:
+            self.load()
+
+        terms = sorted(list_of_words)
+        key = (tuple(terms), use_pagerank, k)
+        if key in self.cache:
+            self.cache_hits += 1
+            self.cache.move_to_end(key)
+            return list(self.cache[key])
+
+        self.cache_misses += 1
+        doc_ranking = self.rank(terms, use_pagerank, k)
+        if self.cache_size > 0:
+            self.cache[key] = doc_ranking
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+                self.cache_evictions += 1
+        return list(doc_ranking)
+
+    def rank(self, list_of_words: list, use_pagerank: bool, k: int = 10):
+        """
+        This function scores the query term at a time by accumulating the term
+        relevances in the postings of each query term, and keeps the k best
+        documents. Documents are ordered by highest score first, with ties
+        going to the lower ID, the same as the priority queue ordering used by
+        find_final_rankings.
+
+        Parameters:
+        list_of_words: A list of the stemmed, stop word free query terms
+        use_pagerank: A boolean, true, if the scores should be multiplied by
+        each document's PageRank, and false otherwise
+        k: The number of documents to return
+
+        Returns:
+        A list of up to k (score, id) tuples from best to worst, leaving out
+        documents with a score of 0
+        """
+
+        if isinstance(self.words_to_ids_to_term_relevance, Tiers):
+            return self.rank_tiers(list_of_words, use_pagerank, k)
+        if isinstance(self.words_to_ids_to_term_relevance, Postings):
+            return self.rank_postings(list_of_words, use_pagerank, k)
+
+        postings = {}
+        for word in list_of_words:
+            if word not in postings:
+                found = self.term_postings(word)
+                if found is not None:
+                    postings[word] = found
+
+        if self.prune and len(postings) > 1:
+            # Scores the documents that can still make the top k exactly the
+            # way they would be scored without pruning. The candidates' sums
+            # were added up in a different order, so only those within
+            # rounding of the kth best are worth scoring again.
+            candidates = self.find_candidates(list_of_words, postings,
+                                              use_pagerank, k)
+            if use_pagerank:
+                candidates = {id: relevance * self.ids_to_page_ranks[id]
+                              for id, relevance in candidates.items()}
+            threshold = 0
+            if len(candidates) >= k:
+                threshold = heapq.nlargest(k, candidates.values())[-1]
+            accumulators = {id: 0 for id, score in candidates.items()
+                            if score * BOUND_SLACK * BOUND_SLACK >= threshold}
+            for id in accumulators:
+                score = 0
+                for word in list_of_words:
+                    if word in postings:
+                        relevance = postings[word][0].get(id)
+                        if relevance is not None:
+                            score = score + relevance
+                accumulators[id] = score
+        else:
+            accumulators = {}
+            for word in list_of_words:
+                if word not in postings:
+                    continue
+                for id, relevance in postings[word][0].items():
+                    accumulators[id] = accumulators.get(id, 0) + relevance
+
+        if use_pagerank:
+            for id in accumulators:
+                accumulators[id] = accumulators[id] * self.ids_to_page_ranks[id]
+
+        # Makes scores negative so that the smallest tuples are the best
+        # documents, matching the priority queue ordering
+        best = heapq.nsmallest(k, ((-score, id) for id, score in
+                                   accumulators.items() if score != 0))
+        return [(-negative_score, id) for negative_score, id in best]
+
+    def rank_postings(self, list_of_words: list, use_pagerank: bool,
+                      k: int = 10):
+        """
+        This function ranks the documents the same way as rank, but adds up
+        term relevances many documents at a time from compact postings. With
+        pruning, it is MaxScore over whole postings: terms are taken from the
+        highest possible contribution to the lowest, and once the rest of the
+        terms together can't lift a document that has none of the terms taken
+        so far past the kth best score of the ones that do, the documents
+        that only have the rest of the terms are never scored. Without
+        pruning, or for a single term, every matching document is scored.
+
+        Parameters:
+        list_of_words: A list of the stemmed, stop word free query terms
+        use_pagerank: A boolean, true, if the scores should be multiplied by
+        each document's PageRank, and false otherwise
+        k: The number of documents to return
+
+        Returns:
+        A list of up to k (score, id) tuples from best to worst, leaving out
+        documents with a score of 0
+        """
+
+        postings = self.words_to_ids_to_term_relevance
+        # the number of times each term in the index is in the query
+        counts = collections.Counter(word for word in list_of_words
+                                     if postings.find(word) != -1)
+        if not self.prune or len(counts) < 2:
+            ids, scores = postings.accumulate(list_of_words)
+            return self.top_documents(ids, scores, use_pagerank, k)
+
+        arrays = {word: postings.arrays(postings.find(word))
+                  for word in counts}
+        bounds = {word: count * postings.max_relevance(postings.find(word))
+                  for word, count in counts.items()}
+        terms = sorted(counts, key=lambda word: -bounds[word])
+        max_page_rank = self.max_page_rank if use_pagerank else 1
+        remaining = sum(bounds.values()) - bounds[terms[0]]
+        # the kth best score is at least the kth best score the first term
+        # gives on its own, which is cheap to find. It can't be more than the
+        # first term's bound, so it can't leave out even the last term unless
+        # that is more than the last term's bound.
+        threshold = 0
+        if bounds[terms[0]] > bounds[terms[-1]] * BOUND_SLACK:
+            threshold = self.kth_term_score(arrays[terms[0]],
+                                            counts[terms[0]], use_pagerank, k)
+        for taken, word in enumerate(terms[1:], 1):
+            if remaining * max_page_rank * BOUND_SLACK < threshold:
+                break
+            remaining -= bounds[word]
+        else:
+            ids, scores = postings.accumulate(list_of_words)
+            return self.top_documents(ids, scores, use_pagerank, k)
+
+        # only the documents with one of the terms taken can make the top k
+        if taken == 1:
+            ids = arrays[terms[0]][0]
+        else:
+            ids = np.unique(np.concatenate([arrays[word][0]
+                                            for word in terms[:taken]]))
+        return self.top_documents(
+            ids, self.sum_relevances(ids, list_of_words, arrays),
+            use_pagerank, k)
+
+    def kth_term_score(self, arrays: tuple, count: int, use_pagerank: bool,
+                       k: int):
+        """
+        This function finds the kth best score that the term relevances of
+        one term give documents on their own, which the kth best score of a
+        query with the term can't be less than
+
+        Parameters:
+        arrays: A tuple of the numpy arrays of the ids and term relevances
+        of the postings of the term
+        count: The number of times the term is in the query
+        use_pagerank: A boolean, true, if the scores should be multiplied by
+        each document's PageRank, and false otherwise
+        k: The number of documents to return
+
+        Returns:
+        The kth best score, or 0 if fewer than k documents have the term
+        """
+
+        ids, relevances = arrays
+        if len(ids) < k:
+            return 0
+        scores = count * relevances
+        if use_pagerank:
+            scores = scores * self.page_rank_values[
+                np.searchsorted(self.page_rank_ids, ids)]
+        return np.partition(scores, len(scores) - k)[len(scores) - k]
+
+    def sum_relevances(self, ids, list_of_words: list, arrays: dict):
+        """
+        This function adds up the term relevances of some documents. Each
+        document's relevances are added in the order of the query terms, the
+        same order Postings.accumulate adds them in, so the scores are exactly
+        the ones scoring every document would give.
+
+        Parameters:
+        ids: A sorted numpy array of the ids of the documents
+        list_of_words: A list of the stemmed, stop word free query terms
+        arrays: A dictionary of the query terms in the index to the numpy
+        arrays of the ids and term relevances of their postings
+
+        Returns:
+        A numpy array of the summed term relevance of each document
+        """
+
+        scores = np.zeros(len(ids))
+        for word in list_of_words:
+            if word in arrays:
+                term_ids, relevances = arrays[word]
+                positions = np.minimum(np.searchsorted(term_ids, ids),
+                                       len(term_ids) - 1)
+                scores = scores + np.where(term_ids[positions] == ids,
+                                           relevances[positions], 0.0)
+        return scores
+
+    def rank_tiers(self, list_of_words: list, use_pagerank: bool,
+                   k: int = 10):
+        """
+        This function ranks the documents the same way as rank, a tier at a
+        time. The high-authority tier is scored first, and the tail tier is
+        only scored if the highest score a page in it could have, from the
+        highest term relevances in the tail's postings and the highest
+        PageRank of a page in the tail, could still beat the kth best score
+        of the high tier. A page's postings are all in its tier, so the
+        scores of the high tier's pages are already exact and the results
+        are the same as scoring every document.
 
-def stem_stop(list_of_words: list):
+        Parameters:
+        list_of_words: A list of the stemmed, stop word free query terms
+        use_pagerank: A boolean, true, if the scores should be multiplied by
+        each document's PageRank, and false otherwise
+        k: The number of documents to return
+
+        Returns:
+        A list of up to k (score, id) tuples from best to worst, leaving out
+        documents with a score of 0
+        """
+
+        tiers = self.words_to_ids_to_term_relevance
+        high, tail = tiers.tiers
+        ids, scores = high.accumulate(list_of_words)
+        doc_ranking = self.top_documents(ids, scores, use_pagerank, k)
+        bound = tiers.tail_bound(list_of_words)
+        if use_pagerank:
+            bound = bound * tiers.tail_page_rank
+        if len(doc_ranking) == k and \
+                bound * BOUND_SLACK < doc_ranking[-1][0]:
+            return doc_ranking
+        tail_ids, tail_scores = tail.accumulate(list_of_words)
+        return self.top_documents(np.concatenate((ids, tail_ids)),
+                                  np.concatenate((scores, tail_scores)),
+                                  use_pagerank, k)
+
+    def top_documents(self, ids, scores, use_pagerank: bool, k: int):
+        """
+        This function finds the k best documents from the summed term
+        relevances of every document that has any of the query terms
+
+        Parameters:
+        ids: A numpy array of the ids of the documents
+        scores: A numpy array of the summed term relevance of each document
+        use_pagerank: A boolean, true, if the scores should be multiplied by
+        each document's PageRank, and false otherwise
+        k: The number of documents to return
+
+        Returns:
+        A list of up to k (score, id) tuples from best to worst, with ties
+        going to the lower ID, leaving out documents with a score of 0
+        """
+
+        if use_pagerank:
+            scores = scores * self.page_rank_values[
+                np.searchsorted(self.page_rank_ids, ids)]
+        nonzero = scores != 0
+        ids, scores = ids[nonzero], scores[nonzero]
+        if len(scores) > k:
+            # keeps every document tied with the kth best for the sort below
+            kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+            best = scores >= kth
+            ids, scores = ids[best], scores[best]
+        order = np.lexsort((ids, -scores))[:k]
+        return list(zip(scores[order].tolist(), ids[order].tolist()))
+
+    def term_postings(self, word: str):
+        """
+        This function looks up the postings of a query term along with the
+        highest term relevance in them
+
+        Parameters:
+        word: A stemmed query term
+
+        Returns:
+        A tuple of a dictionary (or PostingList) of IDs to term relevance and
+        the highest term relevance, or None if the term isn't in the index
+        """
+
+        words = self.words_to_ids_to_term_relevance
+        slot = words.find(word)
+        if slot == -1:
+            return None
+        if isinstance(words, file_io.BinaryWordsIndex):
+            ids, relevances = words.postings(slot)
+            return dict(zip(ids, relevances)), words.max_relevance(slot)
+        return words[word], words.max_relevance(slot)
+
+    def kth_score(self, accumulators: dict, use_pagerank: bool, k: int):
+        """
+        This function finds the kth highest partial score of the documents
+        scored so far, which the final kth best score can't be lower than
+
+        Parameters:
+        accumulators: A dictionary of IDs to the sum of their term relevances
+        so far
+        use_pagerank: A boolean, true, if scores are multiplied by PageRank
+        k: The number of documents being returned
+
+        Returns:
+        The kth highest partial score, or 0 if fewer than k documents have
+        been scored
+        """
+
+        if len(accumulators) < k:
+            return 0
+        if use_pagerank:
+            scores = (relevance * self.ids_to_page_ranks[id]
+                      for id, relevance in accumulators.items())
+        else:
+            scores = accumulators.values()
+        return heapq.nlargest(k, scores)[-1]
+
+    def find_candidates(self, list_of_words: list, postings: dict,
+                        use_pagerank: bool, k: int):
+        """
+        This function finds the documents that can still be in the top k using
+        MaxScore pruning. Terms are visited from the highest possible
+        contribution to the lowest. Once the terms left can't add up to the
+        current kth best score, documents that haven't been seen can't make
+        the top k, so the remaining postings are only used to update the
+        documents already seen, and any of those that can't reach the kth
+        best score anymore are dropped.
+
+        Parameters:
+        list_of_words: A list of the stemmed, stop word free query terms
+        postings: A dictionary of each query term in the index to its postings
+        and highest term relevance, from term_postings
+        use_pagerank: A boolean, true, if scores are multiplied by PageRank
+        k: The number of documents being returned
+
+        Returns:
+        A dictionary with the IDs of the candidate documents as its keys
+        """
+
+        counts = {}
+        for word in list_of_words:
+            if word in postings:
+                counts[word] = counts.get(word, 0) + 1
+        bounds = {word: postings[word][1] * count
+                  for word, count in counts.items()}
+        max_page_rank = self.max_page_rank if use_pagerank else 1
+        remaining = sum(bounds.values())
+        visited = 0
+        pruning = False
+        # what remaining has to fall below before looking for the kth best
+        # score again, since that looks at every document seen so far
+        retry_below = remaining
+
+        accumulators = {}
+        for word in sorted(counts, key=lambda word: bounds[word],
+                           reverse=True):
+            ids_to_relevance = postings[word][0]
+            count = counts[word]
+
+            # The kth best score can't be more than the terms visited can add
+            # up to, so it is only worth finding once that passes the rest
+            if not pruning and remaining < visited and \
+                    remaining <= retry_below:
+                threshold = self.kth_score(accumulators, use_pagerank, k)
+                pruning = threshold > 0 and \
+                    remaining * max_page_rank * BOUND_SLACK < threshold
+                retry_below = remaining / 2
+            remaining -= bounds[word]
+            visited += bounds[word]
+
+            if pruning:
+                kept = {}
+                for id, relevance in accumulators.items():
+                    found = ids_to_relevance.get(id)
+                    if found is not None:
+                        relevance += found * count
+                    page_rank = self.ids_to_page_ranks[id] \
+                        if use_pagerank else 1
+                    if (relevance + remaining) * page_rank * BOUND_SLACK >= \
+                            threshold:
+                        kept[id] = relevance
+                accumulators = kept
+                threshold = self.kth_score(accumulators, use_pagerank, k)
+            else:
+                for id, relevance in ids_to_relevance.items():
+                    accumulators[id] = accumulators.get(id, 0) + \
+                        relevance * count
+        return accumulators
+
+    def close(self):
+        """
+        This function closes the titles and words files if they are
+        memory-mapped, and the lexicon
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+
+        if isinstance(self.words_to_ids_to_term_relevance,
+                      (file_io.BinaryWordsIndex, Tiers)):
+            self.words_to_ids_to_term_relevance.close()
+        if isinstance(self.ids_to_titles, file_io.BinaryTitles):
+            self.ids_to_titles.close()
+        if self.lexicon is not None:
+            self.lexicon.close()
+
+
+def serve_shard(connection, index_files: tuple, snapshot: str):
     """
-    This function removes all stop words from a list of strings and stems
-    each word (if applicable) in the list
+    This function is run in the worker process of one shard. It loads the
+    shard's index, sends back None or the error that loading it raised, and
+    then answers the requests sent by a ShardedQueryEngine until it is sent
+    None.
 
     Parameters:
-    list_of_words: A list of words that has been tokenized already
+    connection: The end of the pipe to the ShardedQueryEngine
+    index_files: A tuple of the shard's titles, docs, and words filepaths
+    snapshot: The filepath to the shard's snapshot, or None
 
     Returns:
-    A list of strings in which each string in the list has been stemmed
-    and all the stop words have been removed
+    None
     """
 
-    for i in range(len(list_of_words)-1, -1, -1):
-        if list_of_words[i] in STOP_WORDS:
-            list_of_words.remove(list_of_words[i])
-        else:
-            list_of_words[i] = nltk_test.stem(list_of_words[i])
-    return list_of_words
+    try:
+        engine = QueryEngine(*index_files, snapshot=snapshot)
+    except IOError as e:
+        connection.send(e)
+        connection.close()
+        return
+    connection.send(None)
+    request = connection.recv()
+    while request is not None:
+        if request[0] == "search":
+            _, list_of_words, use_pagerank, k = request
+            doc_ranking = engine.search(list_of_words, use_pagerank, k)
+            connection.send([(score, id, engine.ids_to_titles[id])
+                             for score, id in doc_ranking])
+        elif request[0] == "stats":
+            connection.send(engine.cache_stats())
+        request = connection.recv()
+    engine.close()
+    connection.close()
+
 
-def repl(use_pagerank: bool, title_index: str, doc_index: str, word_index: str):
+class ShardedQueryEngine:
+
+    """
+    This is a class that answers queries over an index that the indexer split
+    into shards. Each shard is loaded by its own worker process, every query
+    is sent to all of them at once, and their top results are merged into the
+    overall top results. Scores don't depend on which shard a page is in, so
+    the results are the same as the unsharded index's.
+    """
+
+    def __init__(self, title_index: str, doc_index: str, word_index: str,
+                 shards: int, snapshot: str = None, lexicon: str = None):
+        """
+        This is the constructor for the ShardedQueryEngine class. It starts a
+        worker process for each shard and waits for all of them to load their
+        shard, raising the error of any that couldn't. The shards' lexicons
+        are opened by this process, so prefix terms are expanded once, with
+        document frequencies over the whole corpus, before a query is sent.
+
+        Parameters:
+        title_index: The titles filepath that the shards' files are named after
+        doc_index: The docs filepath that the shards' files are named after
+        word_index: The words filepath that the shards' files are named after
+        shards: The number of shards
+        snapshot: The snapshot filepath that the shards' snapshots are named
+        after, or None to load the shards' index files
+        lexicon: The lexicon filepath that the shards' lexicons are named
+        after, or None to not expand prefix terms
+
+        Returns:
+        None
+        """
+
+        self.ids_to_titles = {}
+        self.connections = []
+        self.workers = []
+        self.lexicon_filepaths = [] if lexicon is None else [
+            file_io.shard_filepath(lexicon, shard) for shard in range(shards)]
+        self.lexicons = []
+        for shard in range(shards):
+            index_files = tuple(
+                None if filepath is None else
+                file_io.shard_filepath(filepath, shard)
+                for filepath in (title_index, doc_index, word_index))
+            shard_snapshot = None if snapshot is None else \
+                file_io.shard_filepath(snapshot, shard)
+            connection, worker_connection = multiprocessing.Pipe()
+            worker = multiprocessing.Process(
+                target=serve_shard, daemon=True,
+                args=(worker_connection, index_files, shard_snapshot))
+            worker.start()
+            worker_connection.close()
+            self.connections.append(connection)
+            self.workers.append(worker)
+        errors = [connection.recv() for connection in self.connections]
+        for error in errors:
+            if error is not None:
+                self.close()
+                raise error
+        try:
+            self.load_lexicons()
+        except IOError:
+            self.close()
+            raise
+
+    def lexicons_signature(self):
+        """
+        This function finds the modification time and size of each shard's
+        lexicon, which change whenever the indexer writes them again
+
+        Parameters:
+        None
+
+        Returns:
+        A tuple of (modification time, size) tuples of the lexicons
+        """
+
+        signature = []
+        for filepath in self.lexicon_filepaths:
+            stat = os.stat(filepath)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def load_lexicons(self):
+        """
+        This function opens the shards' lexicons, closing the ones that were
+        open
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+
+        self.signature = self.lexicons_signature()
+        for lexicon in self.lexicons:
+            lexicon.close()
+        self.lexicons = []
+        for filepath in self.lexicon_filepaths:
+            self.lexicons.append(file_io.Lexicon(filepath))
+
+    def complete(self, prefix: str, k: int = PREFIX_EXPANSIONS):
+        """
+        This function finds the terms in the shards' lexicons that start with
+        a prefix and are in the most documents of the whole corpus
+
+        Parameters:
+        prefix: The start of a stemmed term
+        k: The most terms to return
+
+        Returns:
+        A list of up to k (term, document frequency) tuples from the most
+        documents to the fewest, which is empty if there are no lexicons
+        """
+
+        # the shards reload their own index files, but the lexicons are
+        # opened by this process
+        if self.lexicons_signature() != self.signature:
+            self.load_lexicons()
+        doc_freqs = collections.Counter()
+        for lexicon in self.lexicons:
+            for term, doc_freq, _ in lexicon.complete(prefix):
+                doc_freqs[term] += doc_freq
+        return top_completions(list(doc_freqs.items()), k)
+
+    def search(self, list_of_words: list, use_pagerank: bool, k: int = 10):
+        """
+        This function sends a query to every shard and merges their top k
+        results, keeping the titles of just those results in ids_to_titles
+
+        Parameters:
+        list_of_words: A list of the stemmed, stop word free query terms
+        use_pagerank: A boolean, true, if the scores should be multiplied by
+        each document's PageRank, and false otherwise
+        k: The number of documents to return
+
+        Returns:
+        A list of up to k (score, id) tuples from best to worst, leaving out
+        documents with a score of 0
+        """
+
+        self.send(list_of_words, use_pagerank, k)
+        return self.gather(k)
+
+    def search_many(self, queries, k: int = 10):
+        """
+        This function answers a stream of queries, sending up to SHARD_WINDOW
+        of them ahead so each shard can move on to the next query without
+        waiting for the slowest shard to finish the current one
+
+        Parameters:
+        queries: An iterable of (list_of_words, use_pagerank) tuples
+        k: The number of documents to return for each query
+
+        Returns:
+        A generator of the result of each query in order, as returned by
+        search, along with the seconds from sending it to merging its results
+        """
+
+        sent = collections.deque()
+        for list_of_words, use_pagerank in queries:
+            if len(sent) == SHARD_WINDOW:
+                yield self.gather(k), time.perf_counter() - sent.popleft()
+            sent.append(time.perf_counter())
+            self.send(list_of_words, use_pagerank, k)
+        while len(sent) > 0:
+            yield self.gather(k), time.perf_counter() - sent.popleft()
+
+    def send(self, list_of_words: list, use_pagerank: bool, k: int):
+        """
+        This function sends a query to every shard
+
+        Parameters:
+        list_of_words: A list of the stemmed, stop word free query terms
+        use_pagerank: A boolean, true, if the scores should be multiplied by
+        each document's PageRank, and false otherwise
+        k: The number of documents to return
+
+        Returns:
+        None
+        """
+
+        for connection in self.connections:
+            connection.send(("search", list_of_words, use_pagerank, k))
+
+    def gather(self, k: int):
+        """
+        This function receives the oldest outstanding results of every shard
+        and merges them. ids_to_titles is replaced with the titles of the
+        merged results, so it only ever holds the titles of one query's
+        results rather than growing with every query answered.
+
+        Parameters:
+        k: The number of documents to return
+
+        Returns:
+        A list of up to k (score, id) tuples from best to worst
+        """
+
+        results = []
+        titles = {}
+        for connection in self.connections:
+            for score, id, title in connection.recv():
+                titles[id] = title
+                results.append((-score, id))
+        # the same ordering as QueryEngine.rank
+        best = heapq.nsmallest(k, results)
+        self.ids_to_titles = {id: titles[id] for _, id in best}
+        return [(-negative_score, id) for negative_score, id in best]
+
+    def cache_stats(self):
+        """
+        This function adds up the statistics of the shards' result caches
+
+        Parameters:
+        None
+
+        Returns:
+        A dictionary of the number of hits, misses, and evictions of the
+        caches and the number of results they hold
+        """
+
+        for connection in self.connections:
+            connection.send(("stats",))
+        stats = {"hits": 0, "misses": 0, "evictions": 0, "size": 0}
+        for connection in self.connections:
+            for name, value in connection.recv().items():
+                stats[name] += value
+        return stats
+
+    def close(self):
+        """
+        This function stops the shards' worker processes and closes their
+        lexicons
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+
+        for lexicon in self.lexicons:
+            lexicon.close()
+
+        for connection in self.connections:
+            try:
+                connection.send(None)
+            except BrokenPipeError:
+                # the worker has already stopped
+                pass
+            connection.close()
+        for worker in self.workers:
+            worker.join()
+
+
+def open_engine(title_index: str, doc_index: str, word_index: str,
+                snapshot: str = None, shards: int = 1, lexicon: str = None,
+                tiered: bool = False):
+    """
+    This function loads a QueryEngine, or a ShardedQueryEngine if the index
+    was split into more than one shard
+
+    Parameters:
+    title_index: The filepath to the file that contains the IDs and titles
+    doc_index: The filepath to the docs file
+    word_index: The filepath that the words_to_doc_frequency dictionary was 
+    written to
+    snapshot: The filepath to a snapshot to load instead of the index files
+    shards: The number of shards the index was split into
+    lexicon: The filepath to the lexicon to expand prefix terms with
+    tiered: A boolean, true, if the postings were split into PageRank tiers
+
+    Returns:
+    The engine
+    """
+
+    if shards > 1:
+        return ShardedQueryEngine(title_index, doc_index, word_index, shards,
+                                  snapshot, lexicon)
+    return QueryEngine(title_index, doc_index, word_index, snapshot=snapshot,
+                       lexicon=lexicon, tiered=tiered)
+
+
+def top_completions(completions: list, k: int):
+    """
+    This function ranks the completions of a prefix by document frequency
+
+    Parameters:
+    completions: A list of (term, document frequency) tuples
+    k: The most completions to return
+
+    Returns:
+    A list of the k completions in the most documents, from the most to the
+    fewest, with ties in alphabetical order
+    """
+
+    return heapq.nsmallest(k, completions,
+                           key=lambda completion: (-completion[1],
+                                                   completion[0]))
+
+
+def query_terms(engine, words: list):
+    """
+    This function turns the words of a query into query terms: stop words
+    are removed and the other words are stemmed, and a word ending in * is a
+    prefix that is expanded into the terms that start with it and are in the
+    most documents, which are then scored like any other term. A prefix is
+    lowercased but not stemmed, since it may not be a whole word.
+
+    Parameters:
+    engine: The QueryEngine or ShardedQueryEngine to expand prefixes with
+    words: A list of the words of the query as the user typed them
+
+    Returns:
+    A list of the query terms
+    """
+
+    terms = stem_stop([word for word in words if not word.endswith("*")])
+    for word in words:
+        prefix = word.lower().rstrip("*")
+        if word.endswith("*") and prefix != "":
+            terms.extend(term for term, _ in engine.complete(prefix))
+    return terms
+
+
+def repl(use_pagerank: bool, title_index: str, doc_index: str, word_index: str,
+         snapshot: str = None, timing: bool = False, shards: int = 1,
+         lexicon: str = None, tiered: bool = False):
     """
     This function prompts the user for a query and answers the query by scoring 
-    its terms against every document. Lastly, it computes the final document 
-    rankings and prompts the user for additional input
+    its terms against the documents that contain them. Lastly, it prints the
+    final document rankings and prompts the user for additional input
 
     Parameters:
     use_pagerank: A boolean, true, if the user wants to account for PageRank, 
@@ -69,54 +1112,278 @@ def repl(use_pagerank: bool, title_index: str, doc_index: str, word_index: str):
     doc_index: The filepath to the docs file
     word_index: The filepath that the words_to_doc_frequency dictionary was 
     written to
+    snapshot: The filepath to a snapshot to load instead of the index files
+    timing: A boolean, true, if the time taken to load the index and to
+    answer the first query should be printed to stderr
+    shards: The number of shards the index was split into
+    lexicon: The filepath to the lexicon to expand prefix terms with
+    tiered: A boolean, true, if the postings were split into PageRank tiers
 
     Returns:
     None
     """
 
-    # Initializes the ids_to_titles, ids_to_page_ranks, and term relevance
-    # dictionaries to be empty so that they can be read in via file.io
-    ids_to_titles = {}
-    ids_to_page_ranks = {}
-    words_to_ids_to_term_relevance = {}
-    file_io.read_title_file(title_index, ids_to_titles)
-    file_io.read_docs_file(doc_index, ids_to_page_ranks)
-    file_io.read_words_file(word_index, words_to_ids_to_term_relevance)
-    print(words_to_ids_to_term_relevance)
+    start = time.perf_counter()
+    engine = open_engine(title_index, doc_index, word_index, snapshot, shards,
+                         lexicon, tiered)
+    # time spent waiting for the user to type doesn't count towards startup
+    startup = time.perf_counter() - start
+    if timing:
+        print("Loaded index in %.1f ms" % (1000 * startup), file=sys.stderr)
+    # imports nltk while the user is typing the first query
+    threading.Thread(target=load_nltk, daemon=True).start()
 
     query = input("Please enter query: ").lower().split()
-    doc_ranking = PriorityQueue()
+    first = True
     while query != [":quit"]:
-        stem_stop_query = stem_stop(query)
-
-        # Runs the inputted query against every document in the corpus
-        for document in ids_to_page_ranks.keys():
-
-            # Scores query against documents using PageRank
-            if use_pagerank:
-                score = score_terms_page_rank(stem_stop_query, document,
-                                              ids_to_page_ranks,
-                                              words_to_ids_to_term_relevance)
-                # Makes score negative because priority queue stores from
-                # least to greatest
-                if (score != 0):
-                    doc_ranking.put((-score, document))
-
-            # Scores query against documents without PageRank
-            else:
-                score = score_terms(stem_stop_query, document,
-                                    words_to_ids_to_term_relevance)
-                # Makes score negative because priority queue stores from
-                # least to greatest
-                if (score != 0):
-                    doc_ranking.put((-score, document))
+        query_start = time.perf_counter()
+        stem_stop_query = query_terms(engine, query)
 
         # Determines the final ranking of documents and prompts the user to
         # enter another query into the terminal
-
-        find_final_rankings(doc_ranking, ids_to_titles)
+        find_final_rankings(engine.search(stem_stop_query, use_pagerank),
+                            engine.ids_to_titles)
+        if timing and first:
+            print("Time to first query: %.1f ms" % (1000 * (
+                startup + time.perf_counter() - query_start)),
+                file=sys.stderr)
+        first = False
         query = input("Please enter query: ").lower().split()
-        doc_ranking = PriorityQueue()
+    engine.close()
+
+def answer_query(engine, query: str, use_pagerank: bool):
+    """
+    This function answers a single query and times how long it took
+
+    Parameters:
+    engine: The QueryEngine or ShardedQueryEngine to answer the query with
+    query: The query as the user typed it
+    use_pagerank: A boolean, true, if the user wants to account for PageRank, 
+    and false otherwise
+
+    Returns:
+    A dictionary of the query, the ranked ids, titles, and scores of the
+    results, and the latency in milliseconds
+    """
+
+    start = time.perf_counter()
+    doc_ranking = engine.search(query_terms(engine, query.split()),
+                                use_pagerank)
+    latency = time.perf_counter() - start
+    return query_result(engine, query, use_pagerank, doc_ranking, latency)
+
+
+def query_result(engine, query: str, use_pagerank: bool, doc_ranking: list,
+                 latency: float):
+    """
+    This function puts together the result of a query for batch output
+
+    Parameters:
+    engine: The QueryEngine or ShardedQueryEngine that answered the query
+    query: The query as the user typed it
+    use_pagerank: A boolean, true, if the query accounted for PageRank
+    doc_ranking: The (score, id) tuples the engine returned
+    latency: The seconds the query took
+
+    Returns:
+    A dictionary of the query, the ranked ids, titles, and scores of the
+    results, and the latency in milliseconds
+    """
+
+    return {"query": query,
+            "pagerank": use_pagerank,
+            "results": [{"id": id, "title": engine.ids_to_titles[id],
+                         "score": score} for score, id in doc_ranking],
+            "latency_ms": latency * 1000}
+
+# the engine each batch worker process answers queries with, set by
+# init_worker
+worker_engine = None
+
+
+def init_worker(engine: QueryEngine):
+    """
+    This function is run once in each batch worker process and stores the
+    engine that was loaded by the parent process
+
+    Parameters:
+    engine: The QueryEngine to answer queries with
+
+    Returns:
+    None
+    """
+
+    global worker_engine
+    worker_engine = engine
+
+
+def run_batch_query(request: tuple):
+    """
+    This function answers one query of a batch in a worker process
+
+    Parameters:
+    request: A tuple of the query, whether to use PageRank, and a dictionary
+    of any extra fields from the JSONL line to copy into the result
+
+    Returns:
+    The result dictionary from answer_query with the extra fields added
+    """
+
+    query, use_pagerank, extra = request
+    result = answer_query(worker_engine, query, use_pagerank)
+    result.update(extra)
+    return result
+
+
+def run_completion(prefix: str):
+    """
+    This function completes a prefix in a worker, for type-ahead
+
+    Parameters:
+    prefix: The start of a term as the user typed it
+
+    Returns:
+    A dictionary of the prefix and its completions, each with its document
+    frequency
+    """
+
+    return {"prefix": prefix,
+            "completions": [{"term": term, "doc_freq": doc_freq}
+                            for term, doc_freq in
+                            worker_engine.complete(prefix.lower())]}
+
+
+def parse_query_line(line: str):
+    """
+    This function parses a line of a batch or of a server connection, which
+    is either the query itself or a JSON object with a "query" field (and
+    optionally a "pagerank" field and other fields such as an id that are
+    passed through)
+
+    Parameters:
+    line: The line without surrounding whitespace
+
+    Returns:
+    A (query, use_pagerank, extra fields) tuple, where use_pagerank is None
+    unless the line sets it. A ValueError is raised if the line isn't valid
+    JSON or has no string "query" field.
+    """
+
+    if not line.startswith("{"):
+        return line, None, {}
+    extra = json.loads(line)
+    query = extra.pop("query", None)
+    if not isinstance(query, str):
+        raise ValueError("expected a JSON object with a \"query\" field")
+    use_pagerank = extra.pop("pagerank", None)
+    return query, use_pagerank, extra
+
+
+def read_batch_queries(queries_fh):
+    """
+    This function reads the queries of a batch, one per line as parsed by
+    parse_query_line. Lines that can't be parsed are skipped with a message
+    on stderr that gives their line number.
+
+    Parameters:
+    queries_fh: The file to read the queries from
+
+    Returns:
+    A list of (query, use_pagerank, extra fields) tuples, where use_pagerank
+    is None unless the line sets it
+    """
+
+    requests = []
+    for line_number, line in enumerate(queries_fh, 1):
+        line = line.strip()
+        if line == "":
+            continue
+        try:
+            requests.append(parse_query_line(line))
+        except ValueError as error:
+            print("Skipping line %d of the queries: %s" % (line_number, error),
+                  file=sys.stderr)
+    return requests
+
+
+def run_batch(use_pagerank: bool, title_index: str, doc_index: str,
+              word_index: str, queries_path: str, output_path: str,
+              workers: int, snapshot: str = None, shards: int = 1,
+              lexicon: str = None, tiered: bool = False):
+    """
+    This function loads the index once and answers a file of queries,
+    spreading them over a pool of worker processes, and writes one JSON result
+    per line. The number of queries per second is printed at the end.
+
+    Parameters:
+    use_pagerank: A boolean, true, if queries should account for PageRank
+    unless they say otherwise, and false otherwise
+    title_index: The filepath to the file that contains the IDs and titles
+    doc_index: The filepath to the docs file
+    word_index: The filepath that the words_to_doc_frequency dictionary was 
+    written to
+    queries_path: The filepath to read queries from, or - for stdin
+    output_path: The filepath to write the results to, or - for stdout
+    workers: The number of processes to answer queries with
+    snapshot: The filepath to a snapshot to load instead of the index files
+    shards: The number of shards the index was split into, which are
+    answered by one process each instead of a pool of workers
+    lexicon: The filepath to the lexicon to expand prefix terms with
+    tiered: A boolean, true, if the postings were split into PageRank tiers
+
+    Returns:
+    None
+    """
+
+    engine = open_engine(title_index, doc_index, word_index, snapshot, shards,
+                         lexicon, tiered)
+    if queries_path == "-":
+        requests = read_batch_queries(sys.stdin)
+    else:
+        with open(queries_path, "r") as queries_fh:
+            requests = read_batch_queries(queries_fh)
+    requests = [(query, use_pagerank if pagerank is None else pagerank, extra)
+                for query, pagerank, extra in requests]
+
+    output_fh = sys.stdout if output_path == "-" else open(output_path, "w")
+    # loaded before the timing starts and before forking, so the first query
+    # of the batch and of each worker isn't charged for importing nltk
+    load_nltk()
+    start = time.perf_counter()
+    try:
+        if workers > 1:
+            with multiprocessing.Pool(workers, initializer=init_worker,
+                                      initargs=(engine,)) as pool:
+                for result in pool.imap(run_batch_query, requests,
+                                        chunksize=16):
+                    output_fh.write(json.dumps(result) + "\n")
+        elif shards > 1:
+            answers = engine.search_many(
+                (query_terms(engine, query.split()), pagerank)
+                for query, pagerank, _ in requests)
+            for (query, pagerank, extra), (doc_ranking, latency) in zip(
+                    requests, answers):
+                result = query_result(engine, query, pagerank, doc_ranking,
+                                      latency)
+                result.update(extra)
+                output_fh.write(json.dumps(result) + "\n")
+        else:
+            init_worker(engine)
+            for request in requests:
+                output_fh.write(json.dumps(run_batch_query(request)) + "\n")
+    finally:
+        if output_fh is not sys.stdout:
+            output_fh.close()
+    elapsed = time.perf_counter() - start
+    print("Ran %d queries in %.3f s (%.1f queries/s)" % (
+        len(requests), elapsed, len(requests) / elapsed if elapsed > 0 else 0),
+        file=sys.stderr)
+    if workers <= 1:
+        print("Result cache: %(hits)d hits, %(misses)d misses, "
+              "%(evictions)d evictions" % engine.cache_stats(),
+              file=sys.stderr)
+    engine.close()
+
 
 def score_terms(list_of_words: list, id: int,
                 words_to_ids_to_term_relevance: dict):
@@ -166,34 +1433,31 @@ def score_terms_page_rank(list_of_words: list, id: int,
             sum = sum + words_to_ids_to_term_relevance[word][id]
     return sum * ids_to_page_ranks[id]
 
-def find_final_rankings(doc_ranking: PriorityQueue, ids_to_title: dict):
+def find_final_rankings(doc_ranking: list, ids_to_title: dict):
     """
     This function prints out the final rankings of documents in the order of 
     highest relevance and/or authority to lowest relevance and/or authority
-    unless all scores are 0 meaning no search results would be found in the 
-    corpus.
+    unless there are no results meaning no search results would be found in
+    the corpus.
 
     Parameters:
-    doc_ranking: A priority queue that stores each page's combined relevance 
-    and/or authority metric in order from lowest to highest
+    doc_ranking: A list of at most 10 (score, id) tuples ordered from the
+    highest combined relevance and/or authority metric to the lowest
     ids_to_title: A dictionary that maps a document ID to its corresponding 
     title
 
     Returns:
     None
     """
-    if doc_ranking.empty():
+    if len(doc_ranking) == 0:
         print("No search results were found")
-    for i in range(1, 11):
-        if doc_ranking.empty():
-            break
-        else:
-            score_doc_pair = doc_ranking.get()
-            print(ids_to_title[score_doc_pair[1]])
-
-try:
-    main()
-except FileNotFoundError as e:
-    print("File was not found.")
-except IOError as e:
-    print("Error reading in file.")
\ No newline at end of file
+    for score, id in doc_ranking[:10]:
+        print(ids_to_title[id])
+
+if __name__ == "__main__":
+    try:
+        main()
+    except FileNotFoundError as e:
+        print("File was not found.")
+    except IOError as e:
+        print("Error reading in file.")
@@ -0,0 +1,257 @@
+"""
+Serves queries from many clients at once over TCP with asyncio, for query.py
+--serve. It is its own module, imported only when serving, since importing
+asyncio slows down the start of every other way of querying.
+"""
+
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from normalize import load_nltk
+from query import init_worker, open_engine, parse_query_line, \
+    run_batch_query, run_completion
+
+
+class QueryServer:
+
+    """
+    This is a class that answers queries from many clients at once over TCP
+    with asyncio, so the index is loaded once rather than every time a
+    querier starts. Each line a client sends is a query, as plain text or as
+    a JSON object like the ones run_batch reads, and each gets one line of
+    JSON back with the ranked titles, scores, and timing. Scoring is CPU
+    bound, so it is run in an executor rather than on the event loop, and a
+    query that is already being answered for another client isn't answered
+    again but waits for the same result.
+    """
+
+    def __init__(self, engine, use_pagerank: bool, workers: int = 1):
+        """
+        This is the constructor for the QueryServer class
+
+        Parameters:
+        engine: The QueryEngine or ShardedQueryEngine to answer queries with
+        use_pagerank: A boolean, true, if queries should account for PageRank
+        unless they say otherwise, and false otherwise
+        workers: The number of processes to answer queries with. With one,
+        queries are answered by a single thread of this process, since the
+        engine and its cache aren't safe to share between threads.
+
+        Returns:
+        None
+        """
+
+        self.engine = engine
+        self.use_pagerank = use_pagerank
+        self.workers = workers
+        if workers > 1:
+            self.executor = ProcessPoolExecutor(
+                workers, initializer=init_worker, initargs=(engine,))
+        else:
+            init_worker(engine)
+            self.executor = ThreadPoolExecutor(1)
+        self.in_flight = {}
+        self.clients = 0
+        self.queries = 0
+        self.coalesced = 0
+
+    async def answer(self, query: str, use_pagerank: bool):
+        """
+        This function answers a query in the executor, or waits for the
+        answer to the same query if another client already asked it and it
+        hasn't been answered yet
+
+        Parameters:
+        query: The query as the client sent it
+        use_pagerank: A boolean, true, if the query should account for
+        PageRank, and false otherwise
+
+        Returns:
+        The result dictionary from answer_query, with whether it was
+        coalesced with a query that was already in flight
+        """
+
+        key = (tuple(query.lower().split()), use_pagerank)
+        future = self.in_flight.get(key)
+        coalesced = future is not None
+        if coalesced:
+            self.coalesced += 1
+        else:
+            future = asyncio.get_running_loop().run_in_executor(
+                self.executor, run_batch_query, (query, use_pagerank, {}))
+            self.in_flight[key] = future
+            future.add_done_callback(lambda _: self.in_flight.pop(key))
+        self.queries += 1
+        # shielded so a client hanging up doesn't cancel the query for the
+        # other clients waiting on it
+        result = dict(await asyncio.shield(future))
+        result["query"] = query
+        result["coalesced"] = coalesced
+        return result
+
+    async def stats(self):
+        """
+        This function returns the statistics of the server. The statistics
+        of the result cache are read in the executor, since a sharded engine
+        gets them over the same pipes the queries are sent over.
+
+        Parameters:
+        None
+
+        Returns:
+        A dictionary of the number of connected clients, queries answered,
+        queries coalesced, and queries in flight, and the statistics of the
+        result cache if the queries are answered in this process
+        """
+
+        stats = {"clients": self.clients, "queries": self.queries,
+                 "coalesced": self.coalesced,
+                 "in_flight": len(self.in_flight)}
+        if self.workers <= 1:
+                stats["cache"] = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.engine.cache_stats)
+        return stats
+
+    async def respond(self, line: str):
+        """
+        This function answers one line sent by a client, which is either a
+        query, :stats to get the statistics of the server, or :complete and a
+        prefix to get the terms that start with it
+
+        Parameters:
+        line: The line without its newline
+
+        Returns:
+        The dictionary to send back
+        """
+
+        if line == ":stats":
+            return await self.stats()
+        if line.startswith(":complete "):
+            return await asyncio.get_running_loop().run_in_executor(
+                self.executor, run_completion, line[len(":complete "):].strip())
+        start = time.perf_counter()
+        try:
+            query, use_pagerank, extra = parse_query_line(line)
+        except ValueError:
+            return {"error": "expected a query or a JSON object with a "
+                    "\"query\" field"}
+        if use_pagerank is None:
+            use_pagerank = self.use_pagerank
+        result = await self.answer(query, use_pagerank)
+        result.update(extra)
+        # latency_ms is the time spent scoring, while total_ms also counts
+        # waiting for the executor
+        result["total_ms"] = 1000 * (time.perf_counter() - start)
+        return result
+
+    async def handle_client(self, reader, writer):
+        """
+        This function answers the lines a client sends, in order, until it
+        hangs up
+
+        Parameters:
+        reader: The asyncio StreamReader of the connection
+        writer: The asyncio StreamWriter of the connection
+
+        Returns:
+        None
+        """
+
+        self.clients += 1
+        try:
+            line = await reader.readline()
+            while line:
+                line = line.decode("utf-8", "replace").strip()
+                if line != "":
+                    try:
+                        response = await self.respond(line)
+                    except Exception as e:
+                        # the client is told what went wrong rather than
+                        # just being hung up on
+                        response = {"error": "%s: %s" % (type(e).__name__,
+                                                          e)}
+                    writer.write((json.dumps(response) + "\n").encode())
+                    await writer.drain()
+                line = await reader.readline()
+        except ConnectionError:
+            # the client hung up without waiting for its answer
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def run(self, host: str, port: int):
+        """
+        This function listens for clients until the server is interrupted
+
+        Parameters:
+        host: The address to listen on
+        port: The port to listen on, or 0 for a free one
+
+        Returns:
+        None
+        """
+
+        server = await asyncio.start_server(self.handle_client, host, port)
+        for sock in server.sockets:
+            print("Serving queries on %s:%d" % sock.getsockname()[:2],
+                  file=sys.stderr, flush=True)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """
+        This function stops the executor and closes the engine
+
+        Parameters:
+        None
+
+        Returns:
+        None
+        """
+
+        self.executor.shutdown()
+        self.engine.close()
+
+
+def serve(use_pagerank: bool, title_index: str, doc_index: str,
+          word_index: str, host: str, port: int, workers: int = 1,
+          snapshot: str = None, shards: int = 1, lexicon: str = None,
+          tiered: bool = False):
+    """
+    This function loads the index once and serves queries with a
+    QueryServer until it is interrupted
+
+    Parameters:
+    use_pagerank: A boolean, true, if queries should account for PageRank
+    unless they say otherwise, and false otherwise
+    title_index: The filepath to the file that contains the IDs and titles
+    doc_index: The filepath to the docs file
+    word_index: The filepath that the words_to_doc_frequency dictionary was 
+    written to
+    host: The address to listen on
+    port: The port to listen on, or 0 for a free one
+    workers: The number of processes to answer queries with
+    snapshot: The filepath to a snapshot to load instead of the index files
+    shards: The number of shards the index was split into
+    lexicon: The filepath to the lexicon to expand prefix terms with
+    tiered: A boolean, true, if the postings were split into PageRank tiers
+
+    Returns:
+    None
+    """
+
+    engine = open_engine(title_index, doc_index, word_index, snapshot, shards,
+                         lexicon, tiered)
+    # loaded before forking so the workers don't each import nltk
+    load_nltk()
+    server = QueryServer(engine, use_pagerank, workers)
+    try:
+        asyncio.run(server.run(host, port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,68 @@
+"""
+Provides the run files of single-pass in-memory indexing (SPIMI), where the
+indexer spills its partial inverted index to disk whenever it reaches its
+memory budget and merges the runs into the words file at the end
+"""
+
+import heapq
+import itertools
+import pickle
+
+
+def write_run(run_filepath: str, words_to_ids_to_term_frequency: dict,
+              term_ranks: dict):
+    """
+    Writes a partial inverted index to a run file, one pickled record per term,
+    sorted by the rank of each term so that runs can be merged in that order
+    output looks like:
+    (rank1, word1, [id1_1, id1_2, ...], [tf1_1, tf1_2, ...])
+    (rank2, word2, [id2_1, id2_2, ...], [tf2_1, tf2_2, ...])
+    :param run_filepath: the file that will get written to
+    :param words_to_ids_to_term_frequency: the dictionary that provides words ->
+    ids -> term frequency of the pages since the last run
+    :param term_ranks: a dictionary of every word to the order it first
+    appeared in the corpus
+    :return: n/a
+    """
+    with open(run_filepath, "wb") as run_fh:
+        for word in sorted(words_to_ids_to_term_frequency, key=term_ranks.get):
+            ids_to_tf = words_to_ids_to_term_frequency[word]
+            pickle.dump((term_ranks[word], word, list(ids_to_tf),
+                         list(ids_to_tf.values())), run_fh,
+                        pickle.HIGHEST_PROTOCOL)
+
+
+def read_run(run_filepath: str):
+    """
+    reads the records of a run file back one at a time
+    :param run_filepath: the file that write_run wrote
+    :return: a generator of (rank, word, ids, term frequencies) tuples in rank
+    order
+    """
+    with open(run_filepath, "rb") as run_fh:
+        while True:
+            try:
+                yield pickle.load(run_fh)
+            except EOFError:
+                return
+
+
+def merge_runs(run_filepaths: list):
+    """
+    merges run files with a k-way merge on term rank, holding one record of
+    each run in memory at a time. Runs are written in page order, so the ids
+    of a word come out in the order their pages were indexed
+    :param run_filepaths: the run files, in the order they were written
+    :return: a generator of (word, ids, term frequencies) tuples in the order
+    the words first appeared in the corpus
+    """
+    records = heapq.merge(*(read_run(run_filepath)
+                            for run_filepath in run_filepaths),
+                          key=lambda record: record[0])
+    for _, group in itertools.groupby(records, key=lambda record: record[0]):
+        ids = []
+        term_frequencies = []
+        for _, word, run_ids, run_term_frequencies in group:
+            ids.extend(run_ids)
+            term_frequencies.extend(run_term_frequencies)
+        yield word, ids, term_frequencies
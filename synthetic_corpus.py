@@ -0,0 +1,137 @@
+"""
+Generates synthetic wiki XML corpora in the format that Index reads, for
+benchmarking the indexer and querier at sizes and skews that can be chosen
+"""
+
+import argparse
+import bisect
+import itertools
+import random
+from xml.sax.saxutils import escape
+
+SYLLABLES = ["ba", "ce", "di", "fo", "gu", "ha", "je", "ki", "lo", "mu",
+             "na", "pe", "qui", "ro", "sa", "te", "vi", "wo", "xa", "ze",
+             "tion", "ing", "er", "al", "ous", "ness", "ed", "ly"]
+
+# a few stop words mixed into the text so stop word removal has work to do
+FILLER_WORDS = ["the", "of", "and", "in", "to", "is", "was", "for", "on", "as"]
+
+
+def make_vocabulary(size: int, rng: random.Random):
+    """
+    makes a list of distinct made-up words by joining random syllables
+    :param size: the number of words to make
+    :param rng: the random number generator to use
+    :return: a list of size distinct words
+    """
+    words = []
+    seen = set()
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES)
+                       for _ in range(rng.randint(1, 4)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def zipf_weights(size: int, skew: float):
+    """
+    :param size: the number of ranks
+    :param skew: the Zipf exponent, where 0 is uniform
+    :return: the cumulative weights of ranks 1..size under a Zipf distribution
+    """
+    return list(itertools.accumulate(1 / rank ** skew
+                                     for rank in range(1, size + 1)))
+
+
+def write_corpus(xml_filepath: str, num_pages: int, vocab_size: int = 20000,
+                 zipf_skew: float = 1.1, link_density: float = 5.0,
+                 piped_fraction: float = 0.3, missing_fraction: float = 0.05,
+                 words_per_page: int = 200, seed: int = 0):
+    """
+    Writes a synthetic corpus of pages with titles, ids, and text made of words
+    drawn from a Zipf distribution, with [[links]] and [[piped|links]] to
+    other pages that are themselves drawn from a Zipf distribution so that
+    some pages collect far more links than others
+    :param xml_filepath: the file to write the corpus to
+    :param num_pages: the number of pages
+    :param vocab_size: the number of distinct words in the text
+    :param zipf_skew: the Zipf exponent of word frequencies and link targets
+    :param link_density: the average number of links per page
+    :param piped_fraction: the fraction of links that have display text
+    :param missing_fraction: the fraction of links to pages not in the corpus
+    :param words_per_page: the average number of words per page
+    :param seed: the seed of the random number generator
+    :return: the vocabulary, from most to least frequent
+    """
+    rng = random.Random(seed)
+    vocabulary = make_vocabulary(vocab_size, rng)
+    word_weights = zipf_weights(vocab_size, zipf_skew)
+    # pages are linked to in a shuffled order so popular pages are spread out
+    link_order = list(range(num_pages))
+    rng.shuffle(link_order)
+    link_weights = zipf_weights(num_pages, zipf_skew)
+    titles = ["%s %d" % (vocabulary[i % vocab_size].capitalize(), i)
+              for i in range(num_pages)]
+    link_probability = link_density / words_per_page
+
+    with open(xml_filepath, "w") as xml_fh:
+        xml_fh.write("<xml>\n")
+        for page in range(num_pages):
+            length = rng.randint(words_per_page // 2, words_per_page * 3 // 2)
+            text = []
+            for word in rng.choices(vocabulary, cum_weights=word_weights,
+                                    k=length):
+                if rng.random() < 0.2:
+                    text.append(rng.choice(FILLER_WORDS))
+                if rng.random() < link_probability:
+                    if rng.random() < missing_fraction:
+                        target = "Missing %d" % rng.randrange(num_pages)
+                    else:
+                        rank = bisect.bisect(link_weights,
+                                             rng.random() * link_weights[-1])
+                        target = titles[link_order[min(rank, num_pages - 1)]]
+                    if rng.random() < piped_fraction:
+                        text.append("[[%s|%s %s]]" % (
+                            target, word, rng.choice(vocabulary)))
+                    else:
+                        text.append("[[%s]]" % target)
+                else:
+                    text.append(word.capitalize() if rng.random() < 0.1
+                                else word)
+            xml_fh.write("<page>\n<title>%s</title>\n<id>%d</id>\n"
+                         "<text>%s</text>\n</page>\n" % (
+                             escape(titles[page]), page,
+                             escape(" ".join(text))))
+        xml_fh.write("</xml>\n")
+    return vocabulary
+
+
+def main():
+    """
+    reads in the command line arguments and writes a synthetic corpus
+    :return: n/a
+    """
+    parser = argparse.ArgumentParser(
+        description="Writes a synthetic wiki XML corpus")
+    parser.add_argument("xml_filepath")
+    parser.add_argument("--pages", type=int, default=1000)
+    parser.add_argument("--vocab", type=int, default=20000,
+                        help="number of distinct words")
+    parser.add_argument("--zipf", type=float, default=1.1,
+                        help="Zipf exponent of word and link frequencies")
+    parser.add_argument("--links", type=float, default=5.0,
+                        help="average number of links per page")
+    parser.add_argument("--piped", type=float, default=0.3,
+                        help="fraction of links with display text")
+    parser.add_argument("--words-per-page", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write_corpus(args.xml_filepath, args.pages, args.vocab, args.zipf,
+                 args.links, args.piped, words_per_page=args.words_per_page,
+                 seed=args.seed)
+
+
+if __name__ == "__main__":
+    main()